@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+签名请求准备耗时基准
+
+比较旧的逐次签名方式（每次编码密钥、新建 hmac 对象、重建请求头、
+带参数调用 json.dumps）与 RequestSigner 预编译签名器的耗时，
+分别测试单笔下单和一批 BATCH_ORDER_LIMIT 笔订单的请求体。
+
+用法:
+    python bench_signing.py [--rounds 20000]
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import time
+import timeit
+
+import bitget_api
+
+API_KEY = "bg_0123456789abcdef0123456789abcdef"
+SECRET_KEY = "0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef"
+PASSPHRASE = "bench-passphrase"
+
+
+def legacy_sign_request(method: str, endpoint: str, data) -> tuple:
+    """旧实现：每次请求重新准备密钥、请求头和编码器"""
+    timestamp = str(int(time.time() * 1000))
+    body = json.dumps(data, separators=(',', ':'))
+    message = timestamp + method + endpoint + body
+    mac = hmac.new(
+        bytes(SECRET_KEY, encoding='utf8'),
+        bytes(message, encoding='utf-8'),
+        digestmod='sha256'
+    )
+    signature = base64.b64encode(mac.digest()).decode()
+    headers = {
+        "ACCESS-KEY": API_KEY,
+        "ACCESS-SIGN": signature,
+        "ACCESS-PASSPHRASE": PASSPHRASE,
+        "ACCESS-TIMESTAMP": timestamp,
+        "locale": "zh-CN",
+        "Content-Type": "application/json"
+    }
+    return headers, body
+
+
+def sample_order(index: int = 0) -> dict:
+    """与 _build_market_order 相同结构的下单请求体"""
+    return {
+        "category":    "USDT-FUTURES",
+        "symbol":      "BTCUSDT",
+        "orderType":   "market",
+        "side":        "buy",
+        "qty":         "0.001",
+        "marginMode":  "crossed",
+        "timeInForce": "ioc",
+        "clientOid":   f"market_01J0000000000000000{index:05d}"
+    }
+
+
+def per_call_us(func, rounds: int) -> float:
+    """取 5 轮中最快的一轮，返回单次调用耗时（微秒）"""
+    return min(timeit.repeat(func, number=rounds, repeat=5)) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="签名请求准备耗时基准")
+    parser.add_argument("--rounds", type=int, default=20000, help="每轮调用次数")
+    args = parser.parse_args()
+
+    signer = bitget_api.RequestSigner(API_KEY, SECRET_KEY, PASSPHRASE)
+    order = sample_order()
+    batch = [sample_order(i) for i in range(bitget_api.BATCH_ORDER_LIMIT)]
+
+    # 两种实现对同一时间戳、同一请求体必须生成相同的签名
+    path = "/api/v3/trade/place-batch"
+    headers, body = signer.sign("POST", path, batch)
+    legacy_headers, legacy_body = legacy_sign_request("POST", path, batch)
+    assert body == legacy_body
+    timestamp = headers["ACCESS-TIMESTAMP"]
+    legacy_signature = base64.b64encode(hmac.new(
+        SECRET_KEY.encode(), (timestamp + "POST" + path + legacy_body).encode(), hashlib.sha256
+    ).digest()).decode()
+    assert headers["ACCESS-SIGN"] == legacy_signature
+    assert set(headers) == set(legacy_headers)
+
+    cases = {
+        "单笔下单": ("/api/v3/trade/place-order", order, args.rounds),
+        f"批量下单x{len(batch)}": ("/api/v3/trade/place-batch", batch, max(1, args.rounds // 20)),
+    }
+
+    print(f"{'请求':<14}{'旧实现(us)':>12}{'签名器(us)':>12}{'加速':>8}")
+    for name, (endpoint, data, rounds) in cases.items():
+        before = per_call_us(lambda: legacy_sign_request("POST", endpoint, data), rounds)
+        after = per_call_us(lambda: signer.sign("POST", endpoint, data), rounds)
+        print(f"{name:<14}{before:>12.2f}{after:>12.2f}{before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+bitget_api.py 子命令启动耗时基准
+
+在临时目录中准备合约缓存和交易日志，多次运行不需要访问网络的子命令，
+取中位数减去空解释器（python -c pass）的启动耗时，与目标值比较，
+超出目标时返回非0退出码。目标是相对解释器启动的额外耗时，不受机器快慢影响。
+修改 bitget_core.py 后都应重新运行。
+
+用法:
+    python bench_startup.py [--runs 15]
+"""
+
+import argparse
+import json
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import bitget_api
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitget_api.py")
+CORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitget_core.py")
+CREDENTIALS = ["--api-key", "bench", "--secret-key", "bench", "--passphrase", "bench"]
+
+# 子命令 -> (参数, 相对 python -c pass 的目标额外耗时毫秒)
+TARGETS = {
+    "help": ([], 70),
+    "log": (["log", "--limit", "5"], 70),
+    "info": (["info", "BTCUSDT"], 70),
+    "search": (["search", "BTC", "--limit", "5"], 100),
+}
+
+# 进程内构造 BitgetAPI 的目标耗时（毫秒）
+CONSTRUCT_TARGET_MS = 1.0
+
+
+def prepare_workdir(path: str, contract_count: int = 550, log_records: int = 2000):
+    """生成合约缓存和交易日志"""
+    contracts = {}
+    for i in range(contract_count):
+        base = "BTC" if i == 0 else f"C{i:03d}"
+        symbol = f"{base}USDT"
+        contracts[symbol] = {
+            "symbol": symbol, "baseCoin": base, "quoteCoin": "USDT",
+            "minTradeNum": "0.001", "priceEndStep": "1", "volumePlace": "3", "pricePlace": "1",
+            "sizeMultiplier": "0.001", "minTradeUSDT": "5", "maxTradeUSDT": "1000000",
+            "supportMarginCoins": ["USDT"], "maxLever": "125", "minLever": "1"
+        }
+    bitget_api.write_contract_cache(os.path.join(path, "bitget_contracts_cache.bin"), contracts, time.time())
+
+    records = [
+        {"timestamp": "2024-01-01T00:00:00", "trade_id": f"trade_{i}", "coin": "BTC",
+         "action": "buy", "size": 0.001, "status": "success"}
+        for i in range(log_records)
+    ]
+    with open(os.path.join(path, "trading_log.json"), "w", encoding="utf-8") as f:
+        json.dump({"trading_records": records, "created_at": "", "last_updated": ""}, f)
+
+
+def time_process(argv: list, cwd: str, runs: int) -> float:
+    """运行进程多次，返回耗时中位数（毫秒）"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def time_command(args: list, cwd: str, runs: int) -> float:
+    """运行子命令多次，返回耗时中位数（毫秒）"""
+    return time_process([sys.executable, SCRIPT] + CREDENTIALS + args, cwd, runs)
+
+
+def time_construct(cwd: str, runs: int = 200) -> float:
+    """进程内构造 BitgetAPI 的耗时中位数（毫秒）"""
+    previous = os.getcwd()
+    os.chdir(cwd)
+    try:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            bitget_api.BitgetAPI("bench", "bench", "bench")
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+    finally:
+        os.chdir(previous)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bitget_api.py 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=15, help="每个子命令运行次数")
+    args = parser.parse_args()
+
+    # 测量的是字节码已缓存时的启动耗时；设置了 PYTHONDONTWRITEBYTECODE 时导入不会更新缓存，
+    # 这里显式编译一次，避免修改后的 bitget_core.py 在每次运行时都重新编译
+    py_compile.compile(CORE, doraise=True)
+
+    workdir = tempfile.mkdtemp(prefix="bitget_bench_")
+    failed = False
+    try:
+        prepare_workdir(workdir)
+
+        # 先测空解释器的启动耗时，子命令的目标都是在此之上的额外耗时
+        baseline = time_process([sys.executable, "-c", "pass"], workdir, args.runs)
+        print(f"{'子命令':<12}{'中位数(ms)':>12}{'额外(ms)':>10}{'目标(ms)':>10}  结果")
+        print(f"{'(python)':<12}{baseline:>12.1f}{'-':>10}{'-':>10}")
+
+        construct_ms = time_construct(workdir)
+        ok = construct_ms <= CONSTRUCT_TARGET_MS
+        failed |= not ok
+        print(f"{'BitgetAPI()':<12}{construct_ms:>12.3f}{'-':>10}{CONSTRUCT_TARGET_MS:>10.1f}  {'✅' if ok else '❌'}")
+
+        for name, (cmd_args, target) in TARGETS.items():
+            elapsed = time_command(cmd_args, workdir, args.runs)
+            overhead = elapsed - baseline
+            ok = overhead <= target
+            failed |= not ok
+            print(f"{name:<12}{elapsed:>12.1f}{overhead:>10.1f}{target:>10}  {'✅' if ok else '❌'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5315 @@
+"""
+Bitget 交易API
+支持市价单、限价单和多币种交易
+
+命令行入口是 bitget_api.py；实现放在这个模块里，导入时使用 __pycache__ 中缓存的字节码，
+每次运行命令行不必重新编译整个文件。
+"""
+
+import hashlib
+import hmac
+import base64
+import time
+import json
+import math
+import os
+import random
+import sys
+import io
+import socketserver
+import threading
+import contextlib
+import mmap
+import struct
+import bisect
+import heapq
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Optional, Dict, Any
+import argparse
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:  # Windows 下不做进程间文件锁
+    fcntl = None
+
+# requests、aiohttp、asyncio 导入较慢，只在真正需要网络时才导入，
+# 这样 log 等不访问网络的子命令可以快速启动
+
+
+# 批量下单接口单次最多提交的订单数
+BATCH_ORDER_LIMIT = 50
+
+# 响应头中表示当前窗口剩余请求数的字段（不区分大小写的响应头对象中查找）
+RATE_LIMIT_REMAINING_HEADERS = ("X-RateLimit-Remaining", "x-mbx-used-remain-limit")
+
+# 下单时可以重试的HTTP状态码（限流或服务端错误）
+ORDER_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class IdGenerator:
+    """
+    单调递增、进程内唯一的ID生成器（类似 ULID）
+    
+    ID 由 毫秒时间戳 + 进程号 + 计数器 组成，使用 Crockford Base32 定长编码，
+    同一进程内生成的ID按字典序严格递增；同一毫秒内计数器递增，
+    时钟回拨时沿用上一次的时间戳，不会产生重复。
+    """
+    
+    ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+    TIME_CHARS = 10     # 50 位毫秒时间戳
+    PID_CHARS = 5       # 25 位进程号（Linux pid_max 最大 2^22）
+    COUNTER_CHARS = 6   # 30 位计数器（每毫秒最多约10亿个）
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+    
+    @classmethod
+    def _encode(cls, value: int, width: int) -> str:
+        chars = []
+        for _ in range(width):
+            value, remainder = divmod(value, 32)
+            chars.append(cls.ALPHABET[remainder])
+        return "".join(reversed(chars))
+    
+    def new_id(self, prefix: str = "") -> str:
+        """
+        生成新ID
+        
+        Args:
+            prefix: ID前缀（如 market、trade），与ID之间用下划线连接
+        """
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._counter = 0
+            else:
+                self._counter += 1
+                if self._counter >= 32 ** self.COUNTER_CHARS:
+                    # 计数器用尽，借用下一毫秒
+                    self._last_ms += 1
+                    self._counter = 0
+            timestamp, counter = self._last_ms, self._counter
+        
+        # fork 后的子进程进程号不同，不会与父进程重复
+        body = (self._encode(timestamp, self.TIME_CHARS)
+                + self._encode(os.getpid(), self.PID_CHARS)
+                + self._encode(counter, self.COUNTER_CHARS))
+        return f"{prefix}_{body}" if prefix else body
+
+
+# 全进程共享的ID生成器（clientOid、trade_id）
+_id_generator = IdGenerator()
+
+
+def new_id(prefix: str = "") -> str:
+    """生成单调递增、进程内唯一的ID"""
+    return _id_generator.new_id(prefix)
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即允许的请求速率）
+            capacity: 桶容量（允许的突发请求数），默认等于 rate
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0  # 收到 429 后暂停到该时间（monotonic）
+        self.waiting = 0         # 正在等待令牌的请求数（队列深度）
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+    
+    def _try_acquire(self, tokens: float) -> float:
+        """尝试获取令牌，成功返回0，否则返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+    
+    def _set_waiting(self, delta: int):
+        with self._lock:
+            self.waiting += delta
+    
+    def acquire(self, tokens: float = 1.0):
+        """获取令牌，令牌不足时阻塞等待"""
+        wait = self._try_acquire(tokens)
+        if wait <= 0:
+            return
+        self._set_waiting(1)
+        try:
+            while wait > 0:
+                time.sleep(wait)
+                wait = self._try_acquire(tokens)
+        finally:
+            self._set_waiting(-1)
+    
+    async def acquire_async(self, tokens: float = 1.0):
+        """获取令牌，令牌不足时让出事件循环等待"""
+        import asyncio
+        
+        wait = self._try_acquire(tokens)
+        if wait <= 0:
+            return
+        self._set_waiting(1)
+        try:
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(tokens)
+        finally:
+            self._set_waiting(-1)
+    
+    def observe(self, status_code: int, headers: Optional[Mapping] = None):
+        """
+        根据响应调整令牌桶
+        
+        429 时按 Retry-After（默认1秒）暂停发放令牌；响应头带有剩余请求数时，
+        令牌数不超过服务端给出的剩余次数。
+        """
+        headers = headers or {}
+        with self._lock:
+            now = time.monotonic()
+            if status_code == 429:
+                try:
+                    pause = float(headers.get('Retry-After') or 1.0)
+                except ValueError:
+                    pause = 1.0
+                # 暂停结束后只放行一个请求，之后按速率恢复
+                self.paused_until = max(self.paused_until, now + pause)
+                self.tokens = min(1.0, self.capacity)
+                self.updated_at = self.paused_until
+                return
+            for name in RATE_LIMIT_REMAINING_HEADERS:
+                remaining = headers.get(name)
+                if remaining is None:
+                    continue
+                try:
+                    self._refill(now)
+                    self.tokens = min(self.tokens, max(0.0, float(remaining)))
+                except ValueError:
+                    pass
+                break
+    
+    def stats(self) -> Dict[str, Any]:
+        """当前速率、剩余令牌和等待中的请求数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "tokens": round(self.tokens, 2),
+                "waiting": self.waiting,
+                "paused": max(0.0, round(self.paused_until - time.monotonic(), 3))
+            }
+
+
+class RateLimiter:
+    """
+    按接口类别划分的限流器
+    
+    每个类别一个令牌桶，同一个 BitgetAPI（以及包装它的 AsyncBitgetAPI）
+    的所有线程和协程共享。
+    """
+    
+    # (路径前缀, 类别)，按顺序匹配
+    ENDPOINT_CLASSES = (
+        ("/api/v2/mix/market/", "market"),
+        ("/api/v3/market/", "market"),
+        ("/api/v3/trade/place-batch", "batch"),
+        ("/api/v3/trade/place-order", "trade"),
+        ("/api/v3/trade/order-info", "query"),
+        ("/api/v3/account/", "account"),
+    )
+    
+    def __init__(self, limits: Dict[str, float]):
+        """
+        Args:
+            limits: 类别 -> 每秒请求上限；未列出的类别使用 "default"
+        """
+        self.buckets = {name: TokenBucket(rate) for name, rate in limits.items()}
+        self.buckets.setdefault("default", TokenBucket(10))
+    
+    def classify(self, path: str) -> str:
+        """接口路径所属的类别"""
+        for prefix, name in self.ENDPOINT_CLASSES:
+            if path.startswith(prefix):
+                return name if name in self.buckets else "default"
+        return "default"
+    
+    def bucket(self, path: str) -> TokenBucket:
+        return self.buckets[self.classify(path)]
+    
+    def acquire(self, path: str):
+        self.bucket(path).acquire()
+    
+    async def acquire_async(self, path: str):
+        await self.bucket(path).acquire_async()
+    
+    def observe(self, path: str, status_code: int, headers: Optional[Mapping] = None):
+        self.bucket(path).observe(status_code, headers)
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各类别的限流状态（含等待队列深度）"""
+        return {name: bucket.stats() for name, bucket in self.buckets.items()}
+
+
+class RequestSigner:
+    """
+    预先准备好的请求签名器
+    
+    密钥只编码一次并生成带密钥的 HMAC 对象，每条消息复制一份再更新；
+    固定的请求头只构造一次，请求体用预先创建的 JSON 编码器序列化。
+    """
+    
+    # 紧凑格式的 JSON 编码器（json.dumps 带参数时每次都会新建编码器）；
+    # 请求体都由本模块构造，不会有循环引用，省去循环检查
+    _encoder = json.JSONEncoder(separators=(',', ':'), check_circular=False)
+    
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, locale: str = "zh-CN"):
+        self._mac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+        self._static_headers = {
+            "ACCESS-KEY": api_key,
+            "ACCESS-PASSPHRASE": passphrase,
+            "locale": locale,
+            "Content-Type": "application/json"
+        }
+    
+    def signature(self, timestamp: str, method: str, request_path: str, body: str) -> str:
+        """对 timestamp + method + request_path + body 做 HMAC-SHA256 并 Base64 编码"""
+        mac = self._mac.copy()
+        mac.update((timestamp + method + request_path + body).encode('utf-8'))
+        return base64.b64encode(mac.digest()).decode('ascii')
+    
+    def serialize(self, data: Any) -> str:
+        """序列化请求体，None 表示没有请求体"""
+        return self._encoder.encode(data) if data is not None else ""
+    
+    def sign(self, method: str, request_path: str, data: Any) -> tuple:
+        """
+        序列化请求体并生成签名请求头
+        
+        Returns:
+            (headers, body) 元组
+        """
+        timestamp = str(time.time_ns() // 1000000)
+        body = self.serialize(data)
+        headers = self._static_headers.copy()
+        headers["ACCESS-SIGN"] = self.signature(timestamp, method, request_path, body)
+        headers["ACCESS-TIMESTAMP"] = timestamp
+        return headers, body
+
+
+class PriceCache:
+    """
+    行情价格缓存
+    
+    - 每个交易对按 TTL 缓存最近一次成功的价格
+    - 超过 TTL 但未超过 stale_ttl 时先返回旧价格，同时在后台刷新（stale-while-revalidate）
+    - 同一交易对的并发查询共享一次进行中的请求
+    - 条目数超过 max_size 时淘汰最久未使用的交易对（LRU）
+    """
+    
+    def __init__(self, ttl: float = 2.0, stale_ttl: float = 10.0, max_size: int = 512):
+        """
+        Args:
+            ttl: 价格有效期（秒），<= 0 表示不缓存
+            stale_ttl: 过期价格在多少秒内仍可先返回再后台刷新
+            max_size: 最多缓存的交易对数量
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()  # symbol -> (价格信息, monotonic 获取时间)
+        self._inflight = {}  # symbol -> Future
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                       "evictions": 0, "fetches": 0, "fetch_errors": 0, "fetch_seconds": 0.0}
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def lookup(self, symbol: str, refresh=None) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存（不发请求）
+        
+        Args:
+            symbol: 交易对
+            refresh: 价格已过 TTL 但仍可用时用于后台刷新的函数 fetcher(symbol)；
+                为 None 时只返回未过期的价格
+            
+        Returns:
+            价格信息副本，没有可用缓存时返回 None
+        """
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                return None
+            info, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age >= (self.stale_ttl if refresh is not None else self.ttl):
+                return None
+            self._entries.move_to_end(symbol)
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                return dict(info)
+            self._stats["stale_hits"] += 1
+            start_refresh = symbol not in self._inflight
+            if start_refresh:
+                from concurrent.futures import Future
+                future = self._inflight[symbol] = Future()
+        
+        if start_refresh:
+            threading.Thread(target=self._run_fetch, args=(symbol, refresh, future),
+                             name="bitget-price-refresh", daemon=True).start()
+        return dict(info)
+    
+    def fetch(self, symbol: str, fetcher) -> Dict[str, Any]:
+        """
+        通过 fetcher(symbol) 获取价格并缓存；同一交易对已有进行中的请求时等待其结果
+        """
+        from concurrent.futures import Future
+        
+        with self._lock:
+            self._stats["misses"] += 1
+            future = self._inflight.get(symbol)
+            owner = future is None
+            if owner:
+                future = self._inflight[symbol] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        
+        if owner:
+            self._run_fetch(symbol, fetcher, future)
+        return dict(future.result())
+    
+    def _run_fetch(self, symbol: str, fetcher, future: "Future"):
+        """执行请求，成功的结果写入缓存，并唤醒等待同一请求的调用方"""
+        start = time.monotonic()
+        try:
+            info = fetcher(symbol)
+        except Exception as e:
+            info = {"success": False, "error": f"网络请求失败: {str(e)}"}
+        elapsed = time.monotonic() - start
+        
+        with self._lock:
+            self._stats["fetches"] += 1
+            self._stats["fetch_seconds"] += elapsed
+            if info.get('success'):
+                self._store(symbol, info)
+            else:
+                self._stats["fetch_errors"] += 1
+            self._inflight.pop(symbol, None)
+        future.set_result(info)
+    
+    def put(self, symbol: str, info: Dict[str, Any]):
+        """写入一条成功的价格（如来自全量行情快照）"""
+        if self.ttl <= 0 or not info.get('success'):
+            return
+        with self._lock:
+            self._store(symbol, info)
+    
+    def _store(self, symbol: str, info: Dict[str, Any]):
+        if self.ttl <= 0:
+            return
+        self._entries[symbol] = (dict(info), time.monotonic())
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中率、请求次数和平均请求耗时"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        stats["avg_fetch_ms"] = round(stats["fetch_seconds"] / stats["fetches"] * 1000, 2) if stats["fetches"] else 0.0
+        stats["fetch_seconds"] = round(stats["fetch_seconds"], 4)
+        return stats
+
+
+class ContractSearchIndex:
+    """
+    合约搜索索引
+    
+    精确匹配用字典，前缀匹配用有序数组 + 二分查找，子串匹配用 n-gram 倒排索引。
+    排序规则与线性扫描一致：symbol完全匹配 > baseCoin完全匹配 > symbol前缀 >
+    baseCoin前缀 > 其他包含匹配，同一级别内保持合约缓存中的顺序。
+    """
+    
+    NGRAM = 3
+    
+    def __init__(self):
+        self.source = None  # 索引对应的 contracts_cache 对象
+        self._entries = {}  # symbol -> (order, symbol_upper, base_upper, quote_upper)
+        self._next_order = 0
+        self._by_symbol = {}  # symbol_upper -> {symbol}
+        self._by_base = {}  # base_upper -> {symbol}
+        self._symbol_sorted = []  # [(symbol_upper, order, symbol)]
+        self._base_sorted = []  # [(base_upper, order, symbol)]
+        self._grams = {}  # n-gram -> {symbol}
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @classmethod
+    def _ngrams(cls, text: str) -> set:
+        """文本中所有长度为 1..NGRAM 的子串"""
+        return {
+            text[i:i + n]
+            for n in range(1, cls.NGRAM + 1)
+            for i in range(len(text) - n + 1)
+        }
+    
+    def sync(self, contracts: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        增量同步索引到给定的合约缓存
+        
+        Returns:
+            {"added": 新增数, "removed": 删除数}
+        """
+        removed = [symbol for symbol in self._entries if symbol not in contracts]
+        for symbol in removed:
+            self._remove(symbol)
+        
+        if isinstance(contracts, LazyContractTable):
+            keys = contracts.search_keys()
+        else:
+            keys = ((symbol, contract.get('baseCoin', ''), contract.get('quoteCoin', ''))
+                    for symbol, contract in contracts.items())
+        
+        added = 0
+        for symbol, base_coin, quote_coin in keys:
+            key = (symbol.upper(), str(base_coin).upper(), str(quote_coin).upper())
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                if entry[1:] == key:
+                    continue
+                self._remove(symbol)
+            self._add(symbol, key)
+            added += 1
+        
+        self.source = contracts
+        return {"added": added, "removed": len(removed)}
+    
+    def apply(self, contracts: Dict[str, Dict[str, Any]], updated: list, removed: list):
+        """
+        只更新发生变化的交易对，并把索引来源切换为 contracts
+        
+        Args:
+            contracts: 更新后的合约缓存
+            updated: 新增或信息变化的交易对
+            removed: 已下线的交易对
+        """
+        for symbol in removed:
+            if symbol in self._entries:
+                self._remove(symbol)
+        for symbol in updated:
+            contract = contracts[symbol]
+            key = (symbol.upper(), str(contract.get('baseCoin', '')).upper(),
+                   str(contract.get('quoteCoin', '')).upper())
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                if entry[1:] == key:
+                    continue
+                self._remove(symbol)
+            self._add(symbol, key)
+        self.source = contracts
+    
+    def _add(self, symbol: str, key: tuple):
+        symbol_upper, base_upper, quote_upper = key
+        order = self._next_order
+        self._next_order += 1
+        self._entries[symbol] = (order, symbol_upper, base_upper, quote_upper)
+        
+        self._by_symbol.setdefault(symbol_upper, set()).add(symbol)
+        self._by_base.setdefault(base_upper, set()).add(symbol)
+        bisect.insort(self._symbol_sorted, (symbol_upper, order, symbol))
+        bisect.insort(self._base_sorted, (base_upper, order, symbol))
+        
+        for gram in self._ngrams(symbol_upper) | self._ngrams(base_upper) | self._ngrams(quote_upper):
+            self._grams.setdefault(gram, set()).add(symbol)
+    
+    def _remove(self, symbol: str):
+        order, symbol_upper, base_upper, quote_upper = self._entries.pop(symbol)
+        
+        self._discard(self._by_symbol, symbol_upper, symbol)
+        self._discard(self._by_base, base_upper, symbol)
+        for sorted_list, text in ((self._symbol_sorted, symbol_upper), (self._base_sorted, base_upper)):
+            pos = bisect.bisect_left(sorted_list, (text, order, symbol))
+            if pos < len(sorted_list) and sorted_list[pos] == (text, order, symbol):
+                del sorted_list[pos]
+        
+        for gram in self._ngrams(symbol_upper) | self._ngrams(base_upper) | self._ngrams(quote_upper):
+            self._discard(self._grams, gram, symbol)
+    
+    @staticmethod
+    def _discard(index: Dict[str, set], key: str, symbol: str):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.discard(symbol)
+            if not bucket:
+                del index[key]
+    
+    def first_by_base(self) -> Dict[str, str]:
+        """每个 baseCoin 对应排序最靠前的合约 symbol"""
+        return {
+            base_upper: min(symbols, key=lambda symbol: self._entries[symbol][0])
+            for base_upper, symbols in self._by_base.items()
+        }
+    
+    def _prefix_matches(self, sorted_list: list, query: str):
+        pos = bisect.bisect_left(sorted_list, (query,))
+        while pos < len(sorted_list) and sorted_list[pos][0].startswith(query):
+            yield sorted_list[pos][2]
+            pos += 1
+    
+    def _substring_matches(self, query: str):
+        if not query:
+            return self._entries.keys()
+        if len(query) <= self.NGRAM:
+            return self._grams.get(query, ())
+        
+        # 取查询词所有 n-gram 倒排列表的交集，再校验是否真正包含
+        postings = sorted((self._grams.get(query[i:i + self.NGRAM], set())
+                           for i in range(len(query) - self.NGRAM + 1)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [
+            symbol for symbol in candidates
+            if any(query in text for text in self._entries[symbol][1:])
+        ]
+    
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        按相关性返回前 limit 个匹配的合约 symbol
+        
+        Args:
+            query: 已转为大写并去除空白的查询词
+            limit: 返回结果数量限制
+        """
+        results = []
+        seen = set()
+        order_of = lambda symbol: self._entries[symbol][0]
+        
+        tiers = (
+            lambda: self._by_symbol.get(query, ()),  # 完全匹配symbol
+            lambda: self._by_base.get(query, ()),  # 完全匹配baseCoin
+            lambda: self._prefix_matches(self._symbol_sorted, query),  # symbol开头匹配
+            lambda: self._prefix_matches(self._base_sorted, query),  # baseCoin开头匹配
+            lambda: self._substring_matches(query),  # 其他包含匹配
+        )
+        
+        for tier in tiers:
+            remaining = limit - len(results)
+            if remaining <= 0:
+                break
+            candidates = [symbol for symbol in tier() if symbol not in seen]
+            for symbol in heapq.nsmallest(remaining, candidates, key=order_of):
+                seen.add(symbol)
+                results.append(symbol)
+        
+        return results
+
+
+# 二进制合约缓存文件格式
+# 文件头: magic, 版本, 保留, 缓存时间, 合约数量, 字符串表偏移, 字符串表长度
+CONTRACT_CACHE_MAGIC = b"BGCC"
+CONTRACT_CACHE_VERSION = 1
+_CACHE_HEADER = struct.Struct("<4sHHdIII")
+_CACHE_CACHED_AT_OFFSET = 8  # 文件头中 cached_at 字段的偏移
+# 合约记录: 9 个字符串引用 (偏移, 长度)，volumePlace, pricePlace, 类型标记
+_CACHE_RECORD = struct.Struct("<" + "II" * 9 + "iiI")
+# 以字符串形式保存在字符串表中的字段（保持原始值不变）
+_CACHE_STRING_FIELDS = ('symbol', 'baseCoin', 'quoteCoin', 'minTradeNum', 'priceEndStep',
+                        'sizeMultiplier', 'minTradeUSDT', 'maxTradeUSDT')
+_CACHE_INT_FIELDS = ('volumePlace', 'pricePlace')
+# 类型标记: 第0~1位 整数字段原值为字符串；第2~3位 整数字段、第4~10位 字符串字段
+# （symbol 除外）不在定长记录中，原值（包括 None）在附加JSON中，附加JSON中没有则表示缺失
+_CACHE_INT_EXTRA_BIT = 2
+_CACHE_STRING_EXTRA_BIT = 4
+
+
+def write_contract_cache(path: str, contracts: Dict[str, Dict[str, Any]], cached_at: float):
+    """
+    将合约信息写入紧凑的二进制缓存文件（先写临时文件再原子替换）
+    
+    布局: 文件头 | 按 symbol 排序的记录号数组 | 定长记录（原始顺序）| 字符串表。
+    其余不常用字段以JSON存放在字符串表中，读取时按需解析。
+    """
+    strings = io.BytesIO()
+    string_refs = {}
+    
+    def add_string(value: str) -> tuple:
+        data = value.encode('utf-8')
+        ref = string_refs.get(data)
+        if ref is None:
+            ref = (strings.tell(), len(data))
+            strings.write(data)
+            string_refs[data] = ref
+        return ref
+    
+    symbols = list(contracts)
+    records = []
+    for symbol in symbols:
+        contract = contracts[symbol]
+        extra = {k: v for k, v in contract.items()
+                 if k not in _CACHE_STRING_FIELDS and k not in _CACHE_INT_FIELDS}
+        flags = 0
+        
+        # 只有字符串值放入字符串表；None、缺失和其他类型的值原样保存在附加JSON中，
+        # 读回后与接口返回的数据完全一致
+        refs = [add_string(symbol)]
+        for bit, field in enumerate(_CACHE_STRING_FIELDS[1:]):
+            value = contract.get(field)
+            if isinstance(value, str):
+                refs.append(add_string(value))
+            else:
+                flags |= 1 << (_CACHE_STRING_EXTRA_BIT + bit)
+                refs.append((0, 0))
+                if field in contract:
+                    extra[field] = value
+        
+        ints = []
+        for bit, field in enumerate(_CACHE_INT_FIELDS):
+            value = contract.get(field)
+            if isinstance(value, str) and value.lstrip('-').isdigit() and str(int(value)) == value:
+                flags |= 1 << bit
+                ints.append(int(value))
+            elif isinstance(value, int) and not isinstance(value, bool):
+                ints.append(value)
+            else:
+                flags |= 1 << (_CACHE_INT_EXTRA_BIT + bit)
+                ints.append(0)
+                if field in contract:
+                    extra[field] = value
+        
+        refs.append(add_string(json.dumps(extra, ensure_ascii=False, separators=(',', ':'))))
+        records.append((refs, ints, flags))
+    
+    order = sorted(range(len(symbols)), key=lambda i: symbols[i])
+    
+    body = io.BytesIO()
+    body.write(struct.pack(f"<{len(order)}I", *order))
+    for refs, ints, flags in records:
+        body.write(_CACHE_RECORD.pack(*[x for ref in refs for x in ref], *ints, flags))
+    
+    string_table = strings.getvalue()
+    string_offset = _CACHE_HEADER.size + body.tell()
+    header = _CACHE_HEADER.pack(CONTRACT_CACHE_MAGIC, CONTRACT_CACHE_VERSION, 0, cached_at,
+                                len(symbols), string_offset, len(string_table))
+    
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(body.getvalue())
+        f.write(string_table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def touch_contract_cache(path: str, cached_at: float):
+    """只更新缓存文件头中的缓存时间（合约列表没有变化时使用）"""
+    with open(path, 'r+b') as f:
+        f.seek(_CACHE_CACHED_AT_OFFSET)
+        f.write(struct.pack("<d", cached_at))
+
+
+def diff_contracts(old: Mapping, new: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    比较新旧两份合约信息
+    
+    Returns:
+        {"added": 新上线交易对列表, "removed": 下线交易对列表,
+         "changed": {交易对: {字段: [旧值, 新值]}}}（精度、限额等字段变化）
+    """
+    added = [symbol for symbol in new if symbol not in old]
+    removed = [symbol for symbol in old if symbol not in new]
+    changed = {}
+    for symbol, contract in new.items():
+        if symbol not in old:
+            continue
+        previous = old[symbol]
+        if previous == contract:
+            continue
+        fields = {
+            field: [previous.get(field), contract.get(field)]
+            for field in set(previous) | set(contract)
+            if previous.get(field) != contract.get(field)
+        }
+        if fields:
+            changed[symbol] = fields
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def to_decimal(value) -> "Decimal":
+    """
+    把数量/价格转换为 Decimal（浮点数按 repr 转换，0.1 + 0.2 得到 0.30000000000000004 而不是二进制展开）
+
+    None 和空字符串视为 0，无法解析时抛出 ValueError
+    """
+    from decimal import Decimal, InvalidOperation
+
+    if value is None or value == '':
+        return Decimal(0)
+    if isinstance(value, Decimal):
+        return value
+    try:
+        result = Decimal(repr(value) if isinstance(value, float) else str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"无效的数值: {value}")
+    if not result.is_finite():
+        raise ValueError(f"无效的数值: {value}")
+    return result
+
+
+class OrderRule:
+    """
+    单个交易对的下单精度和限额（由合约信息预先计算，全部使用 Decimal 精确运算）
+
+    - 数量: 取 sizeMultiplier（没有时为 10^-volumePlace）的整数倍，向下取整，不小于 minTradeNum
+    - 价格: 取 priceEndStep × 10^-pricePlace 的整数倍，买单向下、卖单向上取整
+    - 名义价值: 数量 × 价格 不小于 minTradeUSDT、不大于 maxTradeUSDT（为0表示不限制）
+
+    与步长整数倍只差浮点误差（不超过 1e-9 个步长）的数值取最近的整数倍，
+    例如 0.7 - 0.4 = 0.29999999999999993 规整为 0.3 而不是 0.299。
+    """
+
+    __slots__ = ("symbol", "size_step", "size_quantum", "min_size",
+                 "price_step", "price_quantum", "min_notional", "max_notional")
+
+    def __init__(self, symbol: str, contract: Dict[str, Any]):
+        from decimal import Decimal
+
+        self.symbol = symbol
+        volume_place = int(contract.get('volumePlace') or 0)
+        price_place = int(contract.get('pricePlace') or 0)
+
+        multiplier = to_decimal(contract.get('sizeMultiplier'))
+        self.size_step = multiplier if multiplier > 0 else Decimal(1).scaleb(-volume_place)
+        self.size_quantum = Decimal(1).scaleb(min(-volume_place, self.size_step.normalize().as_tuple().exponent))
+        self.min_size = to_decimal(contract.get('minTradeNum'))
+
+        end_step = to_decimal(contract.get('priceEndStep'))
+        self.price_quantum = Decimal(1).scaleb(-price_place)
+        self.price_step = self.price_quantum * (end_step if end_step > 0 else 1)
+
+        self.min_notional = to_decimal(contract.get('minTradeUSDT'))
+        self.max_notional = to_decimal(contract.get('maxTradeUSDT'))
+
+    @staticmethod
+    def _snap(value: "Decimal", step: "Decimal", rounding: str) -> "Decimal":
+        """取 step 的整数倍（浮点误差范围内取最近的整数倍，否则按 rounding 取整）"""
+        from decimal import Decimal, ROUND_HALF_EVEN
+
+        units = value / step
+        nearest = units.to_integral_value(ROUND_HALF_EVEN)
+        if abs(units - nearest) <= Decimal("1e-9"):
+            return nearest * step
+        return units.to_integral_value(rounding) * step
+
+    def normalize(self, side: str, size, price=None, reference_price=None,
+                  reduce_only: bool = False) -> tuple:
+        """
+        规整数量和价格，并检查最小数量和名义价值限额
+
+        Args:
+            side: 方向 (buy/sell)
+            size: 数量
+            price: 限价单价格（市价单为 None）
+            reference_price: 市价单用于检查名义价值的参考价格（没有时不检查）
+            reduce_only: 是否只减仓（平仓单不检查最小名义价值）
+
+        Returns:
+            (数量字符串, 价格字符串或 None)
+
+        Raises:
+            ValueError: 数量或价格不合法，或不满足交易所限额
+        """
+        from decimal import ROUND_CEILING, ROUND_FLOOR
+
+        raw_size = to_decimal(size)
+        if raw_size <= 0:
+            raise ValueError(f"{self.symbol} 数量必须大于0: {size}")
+        qty = self._snap(raw_size, self.size_step, ROUND_FLOOR).quantize(self.size_quantum)
+        if qty <= 0:
+            raise ValueError(f"{self.symbol} 数量 {size} 按步长 {self.size_step} 取整后为0")
+        if qty < self.min_size:
+            raise ValueError(f"{self.symbol} 数量 {qty} 小于最小交易数量 {self.min_size}")
+
+        price_text = None
+        if price is not None and price != '':
+            raw_price = to_decimal(price)
+            if raw_price <= 0:
+                raise ValueError(f"{self.symbol} 价格必须大于0: {price}")
+            rounding = ROUND_FLOOR if side == "buy" else ROUND_CEILING
+            limit_price = self._snap(raw_price, self.price_step, rounding).quantize(self.price_quantum)
+            if limit_price <= 0:
+                raise ValueError(f"{self.symbol} 价格 {price} 按步长 {self.price_step} 取整后为0")
+            price_text = format(limit_price, 'f')
+            reference_price = limit_price
+
+        if reference_price is not None:
+            notional = qty * to_decimal(reference_price)
+            if not reduce_only and self.min_notional > 0 and notional < self.min_notional:
+                raise ValueError(f"{self.symbol} 订单金额 {notional:.2f} USDT 小于最小下单金额 {self.min_notional} USDT")
+            if self.max_notional > 0 and notional > self.max_notional:
+                raise ValueError(f"{self.symbol} 订单金额 {notional:.2f} USDT 超过最大下单金额 {self.max_notional} USDT")
+
+        return format(qty, 'f'), price_text
+
+
+class OrderRetry:
+    """
+    单笔下单的幂等重试策略，同步和异步客户端共用
+    
+    只负责决定下一步做什么并记录交易日志，网络请求由调用方完成:
+        
+        retry = OrderRetry(api, order_data, lookup_first)
+        while retry.next_attempt():
+            sleep(retry.delay)
+            if retry.needs_lookup:
+                按 clientOid 查询，结果交给 lookup_done / lookup_failed
+            提交订单，结果交给 response / request_failed
+        retry.give_up()
+    
+    - 网络异常、5xx: 订单可能已经创建，下次提交前先按 clientOid 查询
+    - 429: 请求被拒绝，直接重发
+    - 查询失败: 无法确认订单是否存在，不能重发，等待后再次查询
+    
+    每次需要重试的步骤都记为 retry；最终结果（success/failed/recovered）只在
+    log_outcome 为 True 时记录，调用方自己记录成交结果时传 False，避免同一笔订单记两次。
+    最终结果中的 attempts 为尝试次数，recovered 表示订单是通过查询找回的。
+    日志默认同步写入；传入 log(attempt, outcome, error) 时改由该函数处理
+    （异步客户端先暂存，再在线程池中写入，避免阻塞事件循环）。
+    """
+    
+    def __init__(self, api: "BitgetAPI", order_data: Dict[str, Any], lookup_first: bool = False,
+                 log_outcome: bool = True, log=None):
+        self.api = api
+        self.order_data = order_data
+        self.lookup_first = lookup_first
+        self.log_outcome = log_outcome
+        self._log = log or (lambda attempt, outcome, error=None:
+                            api._log_order_attempt(order_data, attempt, outcome, error))
+        self.needs_lookup = lookup_first
+        self.attempt = -1
+        self.delay = 0.0
+        self.last_result = None
+        self.last_error = None
+    
+    def next_attempt(self) -> bool:
+        """开始下一次尝试，重试次数用尽时返回 False；delay 为本次尝试前需要等待的秒数"""
+        if self.attempt >= self.api.order_retries:
+            return False
+        self.attempt += 1
+        self.delay = self.api._order_retry_delay(self.attempt) if self.attempt > 0 else 0.0
+        return True
+    
+    def lookup_done(self, found: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """查询成功：订单已存在时返回该订单（调用方直接返回），否则返回 None 继续提交"""
+        if found is not None:
+            if self.log_outcome:
+                self._log(self.attempt, "recovered")
+            found["attempts"] = self.attempt + 1
+            return found
+        self.needs_lookup = False
+        return None
+    
+    def lookup_failed(self, error: Exception):
+        """查询本身失败"""
+        self.last_error = error
+        self._log(self.attempt, "retry", f"查询订单失败: {str(error)}")
+    
+    def request_failed(self, error: Exception):
+        """提交时网络异常，结果未知"""
+        self.last_error, self.last_result = error, None
+        self.needs_lookup = True
+        self._log(self.attempt, "retry", f"网络请求失败: {str(error)}")
+    
+    def response(self, result: Dict[str, Any]) -> bool:
+        """
+        处理提交的响应
+        
+        Returns:
+            True 表示结果为最终结果（调用方直接返回），False 表示需要重试
+        """
+        status_code = result['status_code']
+        if status_code in ORDER_RETRY_STATUS:
+            self.last_error, self.last_result = None, result
+            self.needs_lookup = status_code != 429
+            self._log(self.attempt, "retry", f"HTTP错误: {status_code}")
+            return False
+        
+        if self.log_outcome and (self.attempt > 0 or self.lookup_first):
+            success = status_code == 200 and result['response'].get('code') == '00000'
+            self._log(self.attempt, "success" if success else "failed",
+                      None if success else result['response'].get('msg'))
+        result["attempts"] = self.attempt + 1
+        return True
+    
+    def give_up(self) -> Dict[str, Any]:
+        """重试次数用尽：返回最后一次响应，或抛出最后一次网络异常"""
+        if self.log_outcome:
+            self._log(self.api.order_retries, "failed", "重试次数已用尽")
+        if self.last_result is not None:
+            self.last_result["attempts"] = self.attempt + 1
+            return self.last_result
+        raise self.last_error
+
+
+class LazyContractTable(Mapping):
+    """
+    基于内存映射的只读合约表
+    
+    打开时只解析文件头；查找 symbol 时在排序数组上二分，
+    合约详情在首次访问时才解码。
+    """
+    
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, _, cached_at, count, string_offset, string_size = \
+            _CACHE_HEADER.unpack_from(self._buf, 0)
+        if magic != CONTRACT_CACHE_MAGIC or version != CONTRACT_CACHE_VERSION:
+            self._buf.close()
+            raise ValueError(f"不支持的合约缓存格式: {path}")
+        
+        self.cached_at = cached_at
+        self._count = count
+        self._order_offset = _CACHE_HEADER.size
+        self._records_offset = self._order_offset + 4 * count
+        self._string_offset = string_offset
+        self._decoded = {}  # record_no -> contract dict
+    
+    def _record(self, record_no: int) -> tuple:
+        return _CACHE_RECORD.unpack_from(self._buf, self._records_offset + record_no * _CACHE_RECORD.size)
+    
+    def _string(self, offset: int, length: int) -> str:
+        start = self._string_offset + offset
+        return self._buf[start:start + length].decode('utf-8')
+    
+    def _symbol_at(self, record_no: int) -> str:
+        offset, length = struct.unpack_from("<II", self._buf, self._records_offset + record_no * _CACHE_RECORD.size)
+        return self._string(offset, length)
+    
+    def _find(self, symbol: str) -> int:
+        """二分查找 symbol 对应的记录号，不存在返回 -1"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record_no = struct.unpack_from("<I", self._buf, self._order_offset + 4 * mid)[0]
+            current = self._symbol_at(record_no)
+            if current == symbol:
+                return record_no
+            if current < symbol:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+    
+    def _decode(self, record_no: int) -> Dict[str, Any]:
+        contract = self._decoded.get(record_no)
+        if contract is not None:
+            return contract
+        
+        fields = self._record(record_no)
+        strings = [self._string(fields[i], fields[i + 1]) for i in range(0, 18, 2)]
+        volume_place, price_place, flags = fields[18:]
+        
+        contract = {'symbol': strings[0]}
+        for bit, field in enumerate(_CACHE_STRING_FIELDS[1:]):
+            if not flags & (1 << (_CACHE_STRING_EXTRA_BIT + bit)):
+                contract[field] = strings[bit + 1]
+        for bit, (field, value) in enumerate(zip(_CACHE_INT_FIELDS, (volume_place, price_place))):
+            if not flags & (1 << (_CACHE_INT_EXTRA_BIT + bit)):
+                contract[field] = str(value) if flags & (1 << bit) else value
+        # 附加JSON中包含不在定长记录中的字段（None 或非字符串值）
+        contract.update(json.loads(strings[8]))
+        self._decoded[record_no] = contract
+        return contract
+    
+    def search_keys(self):
+        """按原始顺序返回 (symbol, baseCoin, quoteCoin)，不解码其他字段"""
+        for record_no in range(self._count):
+            fields = self._record(record_no)
+            yield (self._string(fields[0], fields[1]),
+                   self._string(fields[2], fields[3]),
+                   self._string(fields[4], fields[5]))
+    
+    def __getitem__(self, symbol: str) -> Dict[str, Any]:
+        record_no = self._find(symbol) if isinstance(symbol, str) else -1
+        if record_no < 0:
+            raise KeyError(symbol)
+        return self._decode(record_no)
+    
+    def __contains__(self, symbol) -> bool:
+        return isinstance(symbol, str) and self._find(symbol) >= 0
+    
+    def __iter__(self):
+        for record_no in range(self._count):
+            yield self._symbol_at(record_no)
+    
+    def __len__(self) -> int:
+        return self._count
+
+
+class TradeJournal:
+    """
+    追加写入的交易日志（JSON Lines）
+    
+    每条记录一行，追加时只写新增内容；每个分段文件旁有一个 .idx 偏移索引
+    （每条记录一个 8 字节起始偏移），读取最近 N 条时只读文件末尾。
+    当前分段超过 max_segment_bytes 时轮转为 <path>.000001 这样的只读分段。
+    多进程写入通过 <path>.lock 文件锁串行化。
+    
+    interval 刷盘策略下，未刷盘的追加最迟在 fsync_interval 秒后由后台定时器刷盘，
+    close() 和进程退出时也会刷盘，因此最多丢失最近 fsync_interval 秒的记录。
+    """
+    
+    FSYNC_POLICIES = ("always", "interval", "never")
+    _OFFSET = struct.Struct("<Q")
+    
+    def __init__(self, path: str, fsync: str = "interval", fsync_interval: float = 1.0,
+                 max_segment_bytes: int = 16 * 1024 * 1024, legacy_path: Optional[str] = None):
+        """
+        Args:
+            path: 当前分段文件路径
+            fsync: 刷盘策略 always（每次追加）/ interval（间隔 fsync_interval 秒）/ never
+            fsync_interval: interval 策略的刷盘间隔（秒）
+            max_segment_bytes: 单个分段的最大字节数，超过后轮转
+            legacy_path: 旧版 trading_log.json 路径，首次使用时迁移
+        """
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"无效的刷盘策略: {fsync}")
+        
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.legacy_path = legacy_path
+        self._last_fsync = 0.0
+        self._unsynced = False  # 有追加尚未 fsync
+        self._flush_timer = None
+        self._atexit_registered = False
+        self._prepared = False
+        self._thread_lock = threading.RLock()
+    
+    # ---- 文件与锁 ----
+    
+    @contextlib.contextmanager
+    def _locked(self):
+        """线程锁 + 进程间文件锁"""
+        with self._thread_lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path + ".lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def segments(self) -> list:
+        """所有分段文件路径，按时间从旧到新"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + "."
+        rotated = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                suffix = name[len(prefix):]
+                if name.startswith(prefix) and suffix.isdigit():
+                    rotated.append((int(suffix), os.path.join(directory, name)))
+        return [path for _, path in sorted(rotated)] + [self.path]
+    
+    def _prepare(self):
+        """首次使用时迁移旧日志并校验当前分段的索引"""
+        if self._prepared:
+            return
+        with self._locked():
+            if not self._prepared:
+                self._migrate_legacy()
+                self._repair_index(self.path)
+                self._prepared = True
+    
+    def _index_path(self, segment: str) -> str:
+        return segment + ".idx"
+    
+    def _read_offsets(self, segment: str, start: int = 0, stop: Optional[int] = None) -> list:
+        """读取分段索引中 [start, stop) 条记录的起始偏移"""
+        try:
+            with open(self._index_path(segment), 'rb') as f:
+                f.seek(start * self._OFFSET.size)
+                size = -1 if stop is None else (stop - start) * self._OFFSET.size
+                data = f.read(size)
+        except FileNotFoundError:
+            return []
+        usable = len(data) - len(data) % self._OFFSET.size
+        return [value for (value,) in self._OFFSET.iter_unpack(data[:usable])]
+    
+    def _segment_count(self, segment: str) -> int:
+        try:
+            return os.path.getsize(self._index_path(segment)) // self._OFFSET.size
+        except FileNotFoundError:
+            return 0
+    
+    def _scan_offsets(self, segment: str) -> list:
+        """扫描分段文件得到每条完整记录的起始偏移"""
+        offsets = []
+        try:
+            with open(segment, 'rb') as f:
+                position = 0
+                for line in f:
+                    if line.endswith(b"\n") and line.strip():
+                        try:
+                            json.loads(line)
+                            offsets.append(position)
+                        except ValueError:
+                            pass  # 崩溃留下的残缺行
+                    position += len(line)
+        except FileNotFoundError:
+            pass
+        return offsets
+    
+    def _repair_index(self, segment: str):
+        """索引与数据不一致（如写入中途崩溃）时重建索引"""
+        try:
+            data_size = os.path.getsize(segment)
+        except FileNotFoundError:
+            data_size = 0
+        
+        offsets = self._read_offsets(segment)
+        consistent = False
+        if not offsets:
+            consistent = data_size == 0
+        elif offsets[-1] < data_size:
+            with open(segment, 'rb') as f:
+                f.seek(offsets[-1])
+                last_line = f.readline()
+            consistent = last_line.endswith(b"\n") and offsets[-1] + len(last_line) == data_size
+        
+        if not consistent:
+            offsets = self._scan_offsets(segment)
+            with open(self._index_path(segment), 'wb') as f:
+                f.write(b"".join(self._OFFSET.pack(offset) for offset in offsets))
+    
+    def _sync(self, files: list, force: bool = False):
+        """按刷盘策略 fsync（调用方持有 _locked）"""
+        now = time.monotonic()
+        if force or self.fsync == "always" or \
+                (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            for f in files:
+                f.flush()
+                os.fsync(f.fileno())
+            self._last_fsync = now
+            self._unsynced = False
+        elif self.fsync == "interval":
+            self._unsynced = True
+            self._schedule_flush(self._last_fsync + self.fsync_interval - now)
+    
+    def _schedule_flush(self, delay: float):
+        """interval 策略：到期后由后台定时器刷盘，并在进程退出时刷盘"""
+        if not self._atexit_registered:
+            import atexit
+            
+            atexit.register(self.close)
+            self._atexit_registered = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(max(0.0, delay), self._timer_flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _timer_flush(self):
+        with self._thread_lock:
+            self._flush_timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ 交易日志刷盘失败: {str(e)}")
+    
+    def _fsync_current(self):
+        """fsync 当前分段及其索引（调用方持有 _locked）"""
+        if not self._unsynced:
+            return
+        for path in (self.path, self._index_path(self.path)):
+            if os.path.exists(path):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+    
+    def flush(self):
+        """立即 fsync 尚未刷盘的追加"""
+        if not self._unsynced:
+            return
+        with self._locked():
+            self._fsync_current()
+    
+    def close(self):
+        """取消刷盘定时器并刷盘"""
+        with self._thread_lock:
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+    
+    # ---- 写入 ----
+    
+    def append(self, records: list):
+        """追加多条记录（一次写入，不重写已有内容）"""
+        if not records:
+            return
+        self._prepare()
+        
+        lines = [
+            (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + "\n").encode('utf-8')
+            for record in records
+        ]
+        
+        with self._locked():
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_segment_bytes:
+                self._rotate()
+            
+            with open(self.path, 'ab') as data_file, open(self._index_path(self.path), 'ab') as index_file:
+                position = data_file.tell()
+                # 上次写入中途崩溃留下的半行，先补换行
+                if position > 0:
+                    with open(self.path, 'rb') as f:
+                        f.seek(position - 1)
+                        if f.read(1) != b"\n":
+                            data_file.write(b"\n")
+                            position += 1
+                
+                offsets = []
+                for line in lines:
+                    offsets.append(position)
+                    position += len(line)
+                
+                data_file.write(b"".join(lines))
+                data_file.flush()
+                index_file.write(b"".join(self._OFFSET.pack(offset) for offset in offsets))
+                self._sync([data_file, index_file])
+    
+    def _rotate(self):
+        """当前分段转为只读分段"""
+        self._fsync_current()
+        rotated = self.segments()[:-1]
+        next_seq = int(rotated[-1].rsplit(".", 1)[1]) + 1 if rotated else 1
+        target = f"{self.path}.{next_seq:06d}"
+        os.replace(self.path, target)
+        if os.path.exists(self._index_path(self.path)):
+            os.replace(self._index_path(self.path), self._index_path(target))
+    
+    @staticmethod
+    def _read_legacy_document(path: str) -> Optional[list]:
+        """
+        path 是旧版 trading_log.json 格式（整个文件是一个 JSON 文档）时返回其中的记录，
+        是 JSON Lines 日志或不存在时返回 None
+        """
+        try:
+            with open(path, 'rb') as f:
+                first_line = f.readline()
+        except FileNotFoundError:
+            return None
+        if not first_line.strip():
+            return None
+        
+        try:
+            document = json.loads(first_line)
+        except ValueError:
+            # 旧版按 indent=2 写入，第一行只有 "{"；JSON Lines 的残缺行整体也无法解析
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+            except ValueError:
+                return None
+        if isinstance(document, dict) and 'trading_records' in document:
+            return document.get('trading_records') or []
+        return None
+    
+    def _migrate_legacy(self):
+        """
+        把旧版 trading_log.json 格式的记录迁移到日志中（只执行一次）
+        
+        旧日志可能在 legacy_path，也可能就是 path 本身（调用方沿用了旧的 log_file）；
+        新内容先写入临时文件再替换，原文件保留为 <原路径>.migrated。
+        """
+        source = None
+        records = self._read_legacy_document(self.path)
+        if records is not None:
+            source = self.path
+        elif self.legacy_path and os.path.abspath(self.legacy_path) != os.path.abspath(self.path) \
+                and os.path.exists(self.legacy_path) \
+                and not any(self._segment_count(segment) for segment in self.segments()):
+            records = self._read_legacy_document(self.legacy_path)
+            source = self.legacy_path if records is not None else None
+        if source is None:
+            return
+        
+        lines = [
+            (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + "\n").encode('utf-8')
+            for record in records
+        ]
+        offsets = []
+        position = 0
+        for line in lines:
+            offsets.append(position)
+            position += len(line)
+        
+        tmp_path = f"{self.path}.migrate{os.getpid()}"
+        with open(tmp_path, 'wb') as data_file, open(self._index_path(tmp_path), 'wb') as index_file:
+            data_file.write(b"".join(lines))
+            index_file.write(b"".join(self._OFFSET.pack(offset) for offset in offsets))
+            self._sync([data_file, index_file], force=True)
+        
+        if source == self.path:
+            import shutil
+            
+            # 先保留一份原文件，再原子替换为新格式
+            shutil.copy2(source, source + ".migrated")
+            os.replace(tmp_path, self.path)
+            os.replace(self._index_path(tmp_path), self._index_path(self.path))
+        else:
+            os.replace(tmp_path, self.path)
+            os.replace(self._index_path(tmp_path), self._index_path(self.path))
+            os.replace(source, source + ".migrated")
+        print(f"📦 已迁移 {len(records)} 条交易记录到 {self.path}")
+    
+    def clear(self):
+        """删除所有分段"""
+        with self._locked():
+            for segment in self.segments():
+                for path in (segment, self._index_path(segment)):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._prepared = True
+    
+    def compact(self, keep_last: Optional[int] = None) -> int:
+        """
+        合并所有分段为一个文件
+        
+        Args:
+            keep_last: 只保留最近的记录条数，None 表示全部保留
+            
+        Returns:
+            合并后的记录数
+        """
+        self._prepare()
+        with self._locked():
+            segments = self.segments()
+            lines = []
+            for segment in segments:
+                if os.path.exists(segment):
+                    offsets = set(self._scan_offsets(segment))
+                    with open(segment, 'rb') as f:
+                        position = 0
+                        for line in f:
+                            if position in offsets:
+                                lines.append(line)
+                            position += len(line)
+            if keep_last is not None:
+                lines = lines[-keep_last:] if keep_last > 0 else []
+            
+            offsets = []
+            position = 0
+            for line in lines:
+                offsets.append(position)
+                position += len(line)
+            
+            tmp_path = f"{self.path}.compact{os.getpid()}"
+            with open(tmp_path, 'wb') as data_file, open(self._index_path(tmp_path), 'wb') as index_file:
+                data_file.write(b"".join(lines))
+                index_file.write(b"".join(self._OFFSET.pack(offset) for offset in offsets))
+                self._sync([data_file, index_file], force=True)
+            
+            for segment in segments[:-1]:
+                os.remove(segment)
+                if os.path.exists(self._index_path(segment)):
+                    os.remove(self._index_path(segment))
+            os.replace(tmp_path, self.path)
+            os.replace(self._index_path(tmp_path), self._index_path(self.path))
+            return len(lines)
+    
+    # ---- 读取 ----
+    
+    def count(self) -> int:
+        """记录总数（只读取索引文件大小）"""
+        self._prepare()
+        return sum(self._segment_count(segment) for segment in self.segments())
+    
+    def _read_records(self, segment: str, start: int, stop: int) -> list:
+        """读取分段中第 [start, stop) 条记录"""
+        offsets = self._read_offsets(segment, start, stop + 1)
+        if not offsets:
+            return []
+        end = offsets[stop - start] if len(offsets) > stop - start else None
+        
+        with open(segment, 'rb') as f:
+            f.seek(offsets[0])
+            data = f.read() if end is None else f.read(end - offsets[0])
+        
+        records = []
+        for offset in offsets[:stop - start]:
+            position = offset - offsets[0]
+            line_end = data.find(b"\n", position)
+            try:
+                records.append(json.loads(data[position:line_end if line_end >= 0 else None]))
+            except ValueError:
+                continue
+        return records
+    
+    def iter_reverse(self, before: Optional[int] = None, chunk_size: int = 256):
+        """
+        从新到旧逐条读取记录，内存占用与日志大小无关
+        
+        Args:
+            before: 只读取全局序号小于该值的记录（用于分页游标）
+            chunk_size: 每次从索引读取的记录数
+            
+        Yields:
+            (全局序号, 记录) 元组
+        """
+        self._prepare()
+        
+        segments = self.segments()
+        counts = [self._segment_count(segment) for segment in segments]
+        base = sum(counts)
+        
+        for segment, count in zip(reversed(segments), reversed(counts)):
+            base -= count
+            stop = count if before is None else min(count, before - base)
+            while stop > 0:
+                start = max(0, stop - chunk_size)
+                records = self._read_records(segment, start, stop)
+                for offset, record in zip(range(stop - 1, start - 1, -1), reversed(records)):
+                    yield base + offset, record
+                stop = start
+    
+    def query(self, limit: int = 50, coin: Optional[str] = None, status: Optional[str] = None,
+              action: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按条件从新到旧查询记录
+        
+        Args:
+            limit: 返回记录数量，<= 0 表示不限
+            coin: 币种
+            status: 状态 (success/failed/retry/recovered)
+            action: 方向 (buy/sell)
+            since: 起始时间（ISO格式，包含）
+            until: 结束时间（ISO格式，不包含）
+            cursor: 上一页返回的 next_cursor
+            
+        Returns:
+            {"records": 从旧到新的记录列表, "next_cursor": 下一页游标或 None}
+        """
+        before = int(cursor) if cursor else None
+        coin = coin.upper() if coin else None
+        
+        records = []
+        next_cursor = None
+        for position, record in self.iter_reverse(before):
+            timestamp = str(record.get('timestamp', ''))
+            # 记录按时间顺序追加，早于起始时间即可停止
+            if since and timestamp < since:
+                break
+            if until and timestamp >= until:
+                continue
+            if coin and str(record.get('coin', '')).upper() != coin:
+                continue
+            if status and record.get('status') != status:
+                continue
+            if action and record.get('action') != action:
+                continue
+            
+            if limit > 0 and len(records) >= limit:
+                next_cursor = str(position + 1)
+                break
+            records.append(record)
+        
+        records.reverse()
+        return {"records": records, "next_cursor": next_cursor}
+    
+    def tail(self, limit: int) -> list:
+        """最近 limit 条记录（从旧到新），limit <= 0 返回全部"""
+        self._prepare()
+        
+        collected = []
+        remaining = limit if limit > 0 else None
+        for segment in reversed(self.segments()):
+            count = self._segment_count(segment)
+            if count == 0:
+                continue
+            start = 0 if remaining is None else max(0, count - remaining)
+            collected = self._read_records(segment, start, count) + collected
+            if remaining is not None:
+                remaining -= count - start
+                if remaining <= 0:
+                    break
+        return collected
+
+
+def hash_portfolio_assets(crypto: list) -> Dict[str, Dict[str, Any]]:
+    """
+    计算资产文件中每个币种条目的内容哈希
+    
+    Returns:
+        币种（大写）-> {"hash": 条目规范化JSON的哈希, "quantity": 数量}
+    """
+    assets = {}
+    for item in crypto:
+        canonical = json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        assets[item['name'].upper()] = {
+            "hash": hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest(),
+            "quantity": item.get('quantity', 0)
+        }
+    return assets
+
+
+def diff_portfolio_assets(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> tuple:
+    """
+    比较新旧两份币种状态
+    
+    Returns:
+        (哈希变化或新增的币种 -> 新状态, 已删除的币种列表)
+    """
+    upserts = {coin: asset for coin, asset in new.items()
+               if coin not in old or old[coin]['hash'] != asset['hash']}
+    removed = [coin for coin in old if coin not in new]
+    return upserts, removed
+
+
+def value_portfolio(quantities, prices, target_weights=None, groups=None) -> Dict[str, Any]:
+    """
+    向量化计算投资组合估值（需要 numpy）
+    
+    所有持仓一次性按数组计算：市值、占比、与目标权重的偏离和再平衡金额/数量。
+    缺失或非正的价格被屏蔽：该持仓不计入总市值，占比等结果为 NaN。
+    目标权重只在有价格的持仓之间重新归一化。
+    
+    Args:
+        quantities: 持仓数量
+        prices: 价格（与 quantities 对齐），缺失为 None 或 NaN
+        target_weights: 目标权重（0~1，与 quantities 对齐），None 表示不计算偏离
+        groups: 每个持仓所属的组合编号（0 起的整数），None 表示全部属于同一个组合，
+            多个组合可以在一次调用中分别计算
+    
+    Returns:
+        {"priced": 有价格的掩码, "market_values": 市值（无价格为0）,
+         "totals": 每个组合的总市值, "weights": 占比,
+         "target_weights": 归一化后的目标权重, "drift": 占比 - 目标权重,
+         "rebalance_values": 调整到目标需要买入(+)/卖出(-)的金额,
+         "rebalance_quantities": 对应的数量}，均为 numpy 数组（没有目标权重时后四项为 None）
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("投资组合估值需要 numpy，请先执行: pip install numpy")
+    
+    qty = np.asarray(quantities, dtype=float)
+    px = np.asarray(prices, dtype=float)  # None 转为 NaN
+    group_ids = np.zeros(len(qty), dtype=np.intp) if groups is None else np.asarray(groups, dtype=np.intp)
+    group_count = int(group_ids.max()) + 1 if len(group_ids) else 0
+    
+    priced = np.isfinite(px) & (px > 0) & np.isfinite(qty)
+    market_values = np.where(priced, qty * np.where(priced, px, 0.0), 0.0)
+    totals = np.bincount(group_ids, weights=market_values, minlength=group_count)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row_totals = totals[group_ids]
+        weights = np.where(priced & (row_totals != 0), market_values / row_totals, np.nan)
+        
+        result = {
+            "priced": priced, "market_values": market_values, "totals": totals, "weights": weights,
+            "target_weights": None, "drift": None, "rebalance_values": None, "rebalance_quantities": None
+        }
+        if target_weights is None:
+            return result
+        
+        targets = np.where(priced, np.nan_to_num(np.asarray(target_weights, dtype=float)), 0.0)
+        target_sums = np.bincount(group_ids, weights=targets, minlength=group_count)[group_ids]
+        targets = np.where(priced & (target_sums > 0), targets / target_sums, np.nan)
+        rebalance_values = targets * row_totals - market_values
+        
+        result.update({
+            "target_weights": targets,
+            "drift": weights - targets,
+            "rebalance_values": rebalance_values,
+            "rebalance_quantities": rebalance_values / px
+        })
+    return result
+
+
+class PortfolioStateLog:
+    """
+    自动交易的资产状态（JSON Lines，追加写入）
+    
+    状态由资产文件指纹 source（mtime_ns、大小、内容哈希）和每个币种的
+    {hash, quantity} 组成。每次只追加一行变化：
+    {"source": 指纹, "assets": {币种: 状态}, "removed": [币种]}，
+    带 "reset" 的行表示完整状态。行数超过 compact_lines 时合并成一行（原子替换）。
+    """
+    
+    def __init__(self, path: str, compact_lines: int = 256):
+        """
+        Args:
+            path: 状态文件路径
+            compact_lines: 超过多少行时合并
+        """
+        self.path = path
+        self.compact_lines = compact_lines
+        self._state = None
+        self._lines = 0
+        self._file_stat = None
+    
+    def _current_stat(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _apply_entry(state: Dict[str, Any], entry: Dict[str, Any]):
+        if entry.get('reset'):
+            state['assets'] = {}
+        if 'source' in entry:
+            state['source'] = entry['source']
+        state['assets'].update(entry.get('assets', {}))
+        for coin in entry.get('removed', []):
+            state['assets'].pop(coin, None)
+    
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        回放状态文件（末尾写了一半的行会被忽略）
+        
+        Returns:
+            {"source": 指纹或 None, "assets": {币种: 状态}}，文件不存在时返回 None
+        """
+        # 文件在上次读写之后没有被其他进程修改时直接使用内存中的状态
+        if self._state is not None and self._file_stat == self._current_stat():
+            return self._state
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            self._state = None
+            self._lines = 0
+            return None
+        
+        state = {"source": None, "assets": {}}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self._apply_entry(state, entry)
+        self._state = state
+        self._lines = len(lines)
+        self._file_stat = self._current_stat()
+        if lines and not lines[-1].endswith("\n"):
+            # 上次写入被中断，下次保存时整体重写
+            self._lines = self.compact_lines
+        return state
+    
+    def apply(self, source: Optional[Dict[str, Any]], upserts: Dict[str, Dict[str, Any]],
+              removed: list, reset: bool = False):
+        """追加一行变化，行数过多时合并为完整状态"""
+        entry = {"source": source}
+        if reset:
+            entry["reset"] = True
+        if upserts:
+            entry["assets"] = upserts
+        if removed:
+            entry["removed"] = removed
+        
+        if self._state is None:
+            self._state = {"source": None, "assets": {}}
+        self._apply_entry(self._state, entry)
+        
+        if reset or self._lines + 1 > self.compact_lines:
+            self._rewrite()
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._lines += 1
+        self._file_stat = self._current_stat()
+    
+    def _rewrite(self):
+        """把当前完整状态写成一行（先写临时文件再原子替换）"""
+        entry = {"reset": True, "source": self._state['source'], "assets": self._state['assets']}
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = 1
+        self._file_stat = self._current_stat()
+
+
+class FileWatcher:
+    """
+    监视单个文件的修改（Linux 上使用 inotify，其他平台或 inotify 不可用时轮询 stat）
+    
+    监视的是文件所在目录，编辑器先写临时文件再 rename 覆盖的保存方式也能检测到。
+    wait() 检测到修改后继续等待，直到 debounce 秒内没有新的写入才返回，
+    一次保存产生的多个写事件只触发一次。
+    """
+    
+    # inotify 事件: IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _INOTIFY_MASK = 0x002 | 0x004 | 0x008 | 0x080 | 0x100 | 0x200
+    _EVENT = struct.Struct("iIII")
+    
+    def __init__(self, path: str, debounce: float = 0.2, poll_interval: float = 1.0,
+                 use_inotify: bool = True):
+        """
+        Args:
+            path: 要监视的文件
+            debounce: 最后一次写入后等待多少秒才认为写入完成
+            poll_interval: 轮询模式下 stat 的间隔（秒）
+            use_inotify: 是否尝试使用 inotify
+        """
+        self.path = os.path.abspath(path)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._fd = self._open_inotify() if use_inotify else None
+        self.backend = "inotify" if self._fd is not None else "poll"
+        self._last_stat = self._stat()
+    
+    def _open_inotify(self) -> Optional[int]:
+        """初始化 inotify 并监视文件所在目录，失败时返回 None"""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            directory = os.path.dirname(self.path).encode()
+            if libc.inotify_add_watch(fd, directory, self._INOTIFY_MASK) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+    
+    def _stat(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _read_events(self, timeout: Optional[float]) -> bool:
+        """等待 inotify 事件，返回是否有事件涉及被监视的文件"""
+        import select
+        
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return False
+        
+        name = os.path.basename(self.path).encode()
+        matched = False
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            if data[offset:offset + length].rstrip(b"\0") == name:
+                matched = True
+            offset += length
+        return matched
+    
+    def _poll_changed(self, timeout: Optional[float]) -> bool:
+        """轮询 stat，timeout 内文件指纹变化时返回 True"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._stat()
+            if current != self._last_stat:
+                self._last_stat = current
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            delay = self.poll_interval
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待文件被修改
+        
+        Args:
+            timeout: 最多等待多少秒，None 表示一直等待
+        
+        Returns:
+            timeout 内检测到修改（并且写入已经平静 debounce 秒）时返回 True
+        """
+        if self._fd is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._read_events(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+            while self._read_events(self.debounce):
+                pass
+            self._last_stat = self._stat()
+            return True
+        
+        if not self._poll_changed(timeout):
+            return False
+        while True:
+            time.sleep(self.debounce)
+            current = self._stat()
+            if current == self._last_stat:
+                return True
+            self._last_stat = current
+    
+    def close(self):
+        """关闭 inotify 描述符"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SQLiteStorage:
+    """
+    SQLite 存储后端（WAL 模式）
+    
+    交易记录部分与 TradeJournal 接口一致（append / tail / count / query /
+    iter_reverse / clear / compact），可以直接作为 BitgetAPI.journal 使用；
+    此外还保存合约信息、投资组合快照、自动交易资产状态和行情历史。
+    每次批量写入在一个事务内完成，读取走索引，不需要扫描全部数据。
+    """
+    
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS trades (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               timestamp TEXT NOT NULL DEFAULT '',
+               trade_id TEXT,
+               coin TEXT NOT NULL DEFAULT '',
+               action TEXT,
+               status TEXT,
+               data TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_coin ON trades (coin, id)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_status ON trades (status, id)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_trade_id ON trades (trade_id)",
+        """CREATE TABLE IF NOT EXISTS contracts (
+               symbol TEXT PRIMARY KEY,
+               base_coin TEXT NOT NULL DEFAULT '',
+               quote_coin TEXT NOT NULL DEFAULT '',
+               data TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_contracts_base ON contracts (base_coin)",
+        """CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               name TEXT NOT NULL,
+               taken_at REAL NOT NULL,
+               data TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_snapshots_name ON portfolio_snapshots (name, id)",
+        """CREATE TABLE IF NOT EXISTS portfolio_assets (
+               name TEXT NOT NULL,
+               coin TEXT NOT NULL,
+               hash TEXT NOT NULL,
+               quantity NUMERIC NOT NULL,
+               PRIMARY KEY (name, coin))""",
+        """CREATE TABLE IF NOT EXISTS ticker_history (
+               symbol TEXT NOT NULL,
+               ts INTEGER NOT NULL,
+               price REAL NOT NULL,
+               data TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_ticker_symbol_ts ON ticker_history (symbol, ts)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+    
+    def __init__(self, path: str, synchronous: str = "NORMAL", busy_timeout: float = 5.0):
+        """
+        Args:
+            path: 数据库文件路径
+            synchronous: SQLite synchronous 设置（WAL 模式下 NORMAL 只在检查点时刷盘）
+            busy_timeout: 其他进程持有写锁时的等待时间（秒）
+        """
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self._conn = None
+        self._lock = threading.RLock()
+    
+    # ---- 连接与事务 ----
+    
+    @property
+    def conn(self) -> "sqlite3.Connection":
+        """数据库连接（首次使用时打开并建表）"""
+        if self._conn is None:
+            import sqlite3
+            
+            with self._lock:
+                if self._conn is None:
+                    directory = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(directory, exist_ok=True)
+                    # isolation_level=None：事务由 _transaction 显式控制
+                    conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                           isolation_level=None, check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(f"PRAGMA synchronous={self.synchronous}")
+                    for statement in self.SCHEMA:
+                        conn.execute(statement)
+                    self._conn = conn
+        return self._conn
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        """写事务（BEGIN IMMEDIATE，出错时回滚）"""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def _fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    # ---- 交易记录（与 TradeJournal 接口一致）----
+    
+    def append(self, records: list):
+        """在一个事务内批量追加交易记录"""
+        if not records:
+            return
+        rows = [
+            (str(record.get('timestamp', '')), record.get('trade_id'),
+             str(record.get('coin', '')).upper(), record.get('action'), record.get('status'),
+             json.dumps(record, ensure_ascii=False))
+            for record in records
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO trades (timestamp, trade_id, coin, action, status, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    
+    def count(self) -> int:
+        """记录总数"""
+        return self._fetchall("SELECT COUNT(*) FROM trades")[0][0]
+    
+    def tail(self, limit: int) -> list:
+        """最近 limit 条记录（从旧到新），limit <= 0 返回全部"""
+        rows = self._fetchall("SELECT data FROM trades ORDER BY id DESC LIMIT ?",
+                              (limit if limit > 0 else -1,))
+        return [json.loads(data) for (data,) in reversed(rows)]
+    
+    def iter_reverse(self, before: Optional[int] = None, chunk_size: int = 256):
+        """从新到旧遍历记录，产出 (记录编号, 记录)；before 为不包含的上界"""
+        upper = before
+        while True:
+            if upper is None:
+                rows = self._fetchall("SELECT id, data FROM trades ORDER BY id DESC LIMIT ?",
+                                      (chunk_size,))
+            else:
+                rows = self._fetchall("SELECT id, data FROM trades WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                      (upper, chunk_size))
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield row_id, json.loads(data)
+            upper = rows[-1][0]
+    
+    def query(self, limit: int = 50, coin: Optional[str] = None, status: Optional[str] = None,
+              action: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按条件从新到旧查询记录（参数与返回值同 TradeJournal.query）
+        """
+        conditions = []
+        params = []
+        for column, value in (("coin", coin.upper() if coin else None), ("status", status),
+                              ("action", action)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if cursor:
+            conditions.append("id < ?")
+            params.append(int(cursor))
+        
+        sql = "SELECT id, data FROM trades"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1 if limit > 0 else -1)
+        
+        rows = self._fetchall(sql, tuple(params))
+        next_cursor = None
+        if limit > 0 and len(rows) > limit:
+            next_cursor = str(rows[limit][0] + 1)
+            rows = rows[:limit]
+        
+        return {"records": [json.loads(data) for _, data in reversed(rows)], "next_cursor": next_cursor}
+    
+    def clear(self):
+        """删除所有交易记录"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM trades")
+    
+    def compact(self, keep_last: Optional[int] = None) -> int:
+        """
+        只保留最近 keep_last 条记录（None 表示全部保留）并回收WAL文件空间
+        
+        Returns:
+            保留的记录数
+        """
+        if keep_last is not None:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM trades WHERE id NOT IN "
+                             "(SELECT id FROM trades ORDER BY id DESC LIMIT ?)", (max(0, keep_last),))
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return self.count()
+    
+    # ---- 合约信息 ----
+    
+    def save_contracts(self, contracts: Dict[str, Dict[str, Any]], cached_at: float):
+        """整体替换合约信息"""
+        rows = [
+            (symbol, contract.get('baseCoin', ''), contract.get('quoteCoin', ''),
+             json.dumps(contract, ensure_ascii=False))
+            for symbol, contract in contracts.items()
+        ]
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM contracts")
+            conn.executemany("INSERT INTO contracts (symbol, base_coin, quote_coin, data) "
+                             "VALUES (?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('contracts_cached_at', ?)",
+                         (repr(cached_at),))
+    
+    def apply_contract_changes(self, upserts: Dict[str, Dict[str, Any]], removed: list,
+                               cached_at: float):
+        """增量更新合约信息（只写入变化的交易对）"""
+        rows = [
+            (symbol, contract.get('baseCoin', ''), contract.get('quoteCoin', ''),
+             json.dumps(contract, ensure_ascii=False))
+            for symbol, contract in upserts.items()
+        ]
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM contracts WHERE symbol = ?", [(symbol,) for symbol in removed])
+            conn.executemany("INSERT OR REPLACE INTO contracts (symbol, base_coin, quote_coin, data) "
+                             "VALUES (?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('contracts_cached_at', ?)",
+                         (repr(cached_at),))
+    
+    def load_contracts(self) -> tuple:
+        """
+        读取合约信息
+        
+        Returns:
+            (symbol -> 合约信息 的字典, 缓存时间)，没有数据时缓存时间为 0
+        """
+        meta = self._fetchall("SELECT value FROM meta WHERE key = 'contracts_cached_at'")
+        if not meta:
+            return {}, 0.0
+        rows = self._fetchall("SELECT symbol, data FROM contracts ORDER BY symbol")
+        return {symbol: json.loads(data) for symbol, data in rows}, float(meta[0][0])
+    
+    # ---- 投资组合快照 ----
+    
+    def save_snapshot(self, name: str, data: Dict[str, Any], taken_at: Optional[float] = None):
+        """保存一份投资组合快照（name 一般为资产文件路径）"""
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO portfolio_snapshots (name, taken_at, data) VALUES (?, ?, ?)",
+                         (name, taken_at if taken_at is not None else time.time(),
+                          json.dumps(data, ensure_ascii=False)))
+    
+    def latest_snapshot(self, name: str) -> Optional[Dict[str, Any]]:
+        """最近一份快照，不存在时返回 None"""
+        rows = self._fetchall("SELECT data FROM portfolio_snapshots WHERE name = ? "
+                              "ORDER BY id DESC LIMIT 1", (name,))
+        return json.loads(rows[0][0]) if rows else None
+    
+    # ---- 自动交易资产状态 ----
+    
+    def load_portfolio_state(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        读取资产状态（格式同 PortfolioStateLog.load）
+        
+        Returns:
+            {"source": 指纹或 None, "assets": {币种: 状态}}，没有保存过时返回 None
+        """
+        meta = self._fetchall("SELECT value FROM meta WHERE key = ?", (f"portfolio_source:{name}",))
+        if not meta:
+            return None
+        rows = self._fetchall("SELECT coin, hash, quantity FROM portfolio_assets WHERE name = ?", (name,))
+        return {
+            "source": json.loads(meta[0][0]),
+            "assets": {coin: {"hash": digest, "quantity": quantity} for coin, digest, quantity in rows}
+        }
+    
+    def apply_portfolio_changes(self, name: str, source: Optional[Dict[str, Any]],
+                                upserts: Dict[str, Dict[str, Any]], removed: list, reset: bool = False):
+        """增量更新资产状态（只写入变化的币种）"""
+        with self._transaction() as conn:
+            if reset:
+                conn.execute("DELETE FROM portfolio_assets WHERE name = ?", (name,))
+            conn.executemany("DELETE FROM portfolio_assets WHERE name = ? AND coin = ?",
+                             [(name, coin) for coin in removed])
+            conn.executemany("INSERT OR REPLACE INTO portfolio_assets (name, coin, hash, quantity) "
+                             "VALUES (?, ?, ?, ?)",
+                             [(name, coin, asset['hash'], asset['quantity'])
+                              for coin, asset in upserts.items()])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         (f"portfolio_source:{name}", json.dumps(source)))
+    
+    # ---- 行情历史 ----
+    
+    def record_prices(self, price_infos: list):
+        """在一个事务内批量记录价格（忽略查询失败的条目）"""
+        now_ms = int(time.time() * 1000)
+        rows = []
+        for info in price_infos:
+            if not info.get('success'):
+                continue
+            try:
+                ts = int(info.get('timestamp') or now_ms)
+            except (TypeError, ValueError):
+                ts = now_ms
+            rows.append((info['symbol'], ts, float(info['price']), json.dumps(info, ensure_ascii=False)))
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany("INSERT INTO ticker_history (symbol, ts, price, data) VALUES (?, ?, ?, ?)", rows)
+    
+    def price_history(self, symbol: str, since_ms: Optional[int] = None,
+                      until_ms: Optional[int] = None, limit: int = 1000) -> list:
+        """
+        查询交易对的历史价格（从旧到新）
+        
+        Args:
+            symbol: 交易对
+            since_ms: 起始时间戳（毫秒，包含）
+            until_ms: 结束时间戳（毫秒，不包含）
+            limit: 最多返回最近的多少条
+        """
+        rows = self._fetchall(
+            "SELECT data FROM ticker_history WHERE symbol = ? AND ts >= ? AND ts < ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (symbol, since_ms if since_ms is not None else 0,
+             until_ms if until_ms is not None else 2 ** 62, limit))
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+
+# Bitget 公共行情 WebSocket 地址（V2）
+WS_PUBLIC_URL = "wss://ws.bitget.com/v2/ws/public"
+
+
+class TickerStream:
+    """
+    WebSocket 行情订阅
+    
+    在后台线程中运行事件循环，订阅 ticker 频道并维护线程安全的最新价格表
+    （symbol -> (行情, 接收时间)）。连接断开后按退避重连并重新订阅所有交易对。
+    依赖 aiohttp（首次启动时导入）。
+    """
+    
+    def __init__(self, symbols: list, url: str = WS_PUBLIC_URL, inst_type: str = "USDT-FUTURES",
+                 max_age: float = 5.0, ping_interval: float = 25.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        """
+        Args:
+            symbols: 订阅的交易对列表（如 BTCUSDT）
+            url: WebSocket 地址
+            inst_type: 产品类型
+            max_age: 价格超过多少秒未更新视为过期
+            ping_interval: 发送 ping 的间隔（秒），Bitget 要求30秒内至少一次
+            reconnect_delay: 首次重连等待时间（秒），之后翻倍
+            max_reconnect_delay: 重连等待时间上限（秒）
+        """
+        self.url = url
+        self.inst_type = inst_type
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.symbols = set(symbols)
+        self.stats = {"connects": 0, "messages": 0, "errors": 0}  # 由后台线程更新，读取请用 stats_snapshot()
+        
+        self._prices = {}  # symbol -> (ticker, monotonic 接收时间)
+        self._lock = threading.Lock()  # 保护 _prices 和 stats
+        self._loop = None
+        self._ws = None
+        self._thread = None
+        self._stopping = False
+        self.connected = threading.Event()
+    
+    # ---- 价格表 ----
+    
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """最新行情，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        ticker, received_at = entry
+        if time.monotonic() - received_at > (self.max_age if max_age is None else max_age):
+            return None
+        return ticker
+    
+    def age(self, symbol: str) -> Optional[float]:
+        """距离上次收到该交易对行情的秒数"""
+        with self._lock:
+            entry = self._prices.get(symbol)
+        return None if entry is None else time.monotonic() - entry[1]
+    
+    def _update(self, tickers: list):
+        now = time.monotonic()
+        with self._lock:
+            self.stats["messages"] += 1
+            for ticker in tickers:
+                symbol = ticker.get('instId') or ticker.get('symbol')
+                if symbol:
+                    self._prices[symbol] = (dict(ticker, symbol=symbol), now)
+    
+    def _count(self, name: str):
+        """后台线程更新统计"""
+        with self._lock:
+            self.stats[name] += 1
+    
+    def stats_snapshot(self) -> Dict[str, int]:
+        """连接、消息、错误次数统计的副本"""
+        with self._lock:
+            return dict(self.stats)
+    
+    # ---- 订阅管理 ----
+    
+    def _subscribe_message(self, symbols, op: str = "subscribe") -> str:
+        return json.dumps({
+            "op": op,
+            "args": [{"instType": self.inst_type, "channel": "ticker", "instId": symbol}
+                     for symbol in sorted(symbols)]
+        })
+    
+    def subscribe(self, symbols: list):
+        """增加订阅的交易对（已连接时立即发送订阅）"""
+        new_symbols = set(symbols) - self.symbols
+        if not new_symbols:
+            return
+        self.symbols |= new_symbols
+        loop = self._loop
+        if loop is not None and self.connected.is_set():
+            import asyncio
+            
+            message = self._subscribe_message(new_symbols)
+            asyncio.run_coroutine_threadsafe(self._send(message), loop)
+    
+    async def _send(self, message: str):
+        ws = self._ws
+        if ws is not None and not ws.closed:
+            await ws.send_str(message)
+    
+    # ---- 连接 ----
+    
+    def start(self, wait: Optional[float] = None) -> "TickerStream":
+        """
+        启动后台线程
+        
+        Args:
+            wait: 等待首次连接成功的秒数，None 表示不等待
+        """
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._thread_main, name="bitget-ws", daemon=True)
+            self._thread.start()
+        if wait:
+            self.connected.wait(wait)
+        return self
+    
+    def stop(self, timeout: float = 5.0):
+        """断开连接并停止后台线程"""
+        self._stopping = True
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._wake.set)
+                ws = self._ws
+                if ws is not None:
+                    import asyncio
+                    
+                    asyncio.run_coroutine_threadsafe(ws.close(), loop)
+            except RuntimeError:
+                pass  # 事件循环已经结束
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _thread_main(self):
+        import asyncio
+        
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        finally:
+            self._loop = None
+            loop.close()
+    
+    async def _run(self):
+        """连接、订阅、接收；断开后退避重连"""
+        import asyncio
+        import aiohttp
+        
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        delay = self.reconnect_delay
+        
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=None) as ws:
+                        self._ws = ws
+                        if self.symbols:
+                            await ws.send_str(self._subscribe_message(self.symbols))
+                        self._count("connects")
+                        self.connected.set()
+                        delay = self.reconnect_delay
+                        await self._receive(ws)
+                except Exception:
+                    self._count("errors")
+                finally:
+                    self._ws = None
+                    self.connected.clear()
+                
+                if self._stopping:
+                    break
+                # 退避等待，stop() 可以提前唤醒
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay * (0.5 + random.random() / 2))
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(self.max_reconnect_delay, delay * 2)
+    
+    async def _receive(self, ws):
+        """读取消息直到连接关闭，期间定时发送 ping"""
+        import asyncio
+        import aiohttp
+        
+        next_ping = time.monotonic() + self.ping_interval
+        while not self._stopping:
+            if time.monotonic() >= next_ping:
+                await ws.send_str("ping")
+                next_ping = time.monotonic() + self.ping_interval
+            try:
+                message = await ws.receive(timeout=max(0.0, next_ping - time.monotonic()))
+            except asyncio.TimeoutError:
+                continue
+            
+            if message.type != aiohttp.WSMsgType.TEXT:
+                # CLOSE / CLOSED / ERROR
+                return
+            if message.data == "pong":
+                continue
+            
+            try:
+                payload = json.loads(message.data)
+            except ValueError:
+                continue
+            arg = payload.get('arg') or {}
+            if arg.get('channel') == 'ticker' and payload.get('data'):
+                self._update(payload['data'])
+
+
+class BitgetAPI:
+    """Bitget 交易API类"""
+    
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, 
+                 sandbox: bool = False, log_file: str = "trading_log.jsonl",
+                 pool_size: int = 10, timeout: float = 10, max_retries: int = 3,
+                 backoff_factor: float = 0.5, ticker_snapshot_ttl: float = 3,
+                 max_workers: int = 8, public_rate_limit: float = 20,
+                 trade_rate_limit: float = 10,
+                 symbol_miss_ttl: float = 300, journal_fsync: str = "interval",
+                 storage_db: Optional[str] = None, order_retries: int = 3,
+                 order_retry_backoff: float = 0.5, order_retry_max_delay: float = 8.0,
+                 price_cache_ttl: float = 2.0, price_cache_stale_ttl: float = 10.0,
+                 price_cache_size: int = 512):
+        """
+        初始化API客户端
+        
+        Args:
+            api_key: API密钥
+            secret_key: API私钥
+            passphrase: API密码短语
+            sandbox: 是否使用测试环境
+            log_file: 交易日志文件路径
+            pool_size: HTTP连接池大小（keep-alive 连接数）
+            timeout: 默认请求超时（秒）
+            max_retries: 429/5xx 及连接失败的最大重试次数
+            backoff_factor: 重试退避系数（秒）
+            ticker_snapshot_ttl: 全量行情快照的有效期（秒）
+            max_workers: 并发查询行情的最大线程数
+            public_rate_limit: 公共行情接口每秒请求上限（Bitget 行情接口为 20次/秒/IP）
+            trade_rate_limit: 下单接口每秒请求上限（批量下单为其一半）
+            symbol_miss_ttl: 无法解析的币种在多少秒内不再重复搜索
+            journal_fsync: 交易日志刷盘策略 (always/interval/never)
+            storage_db: SQLite 数据库路径；指定后交易日志、合约信息、投资组合快照
+                和行情历史都保存到该数据库
+            order_retries: 下单网络失败或 429/5xx 时的最大重试次数
+            order_retry_backoff: 下单重试的退避基数（秒），每次翻倍并加随机抖动
+            order_retry_max_delay: 单次下单重试的最大等待时间（秒）
+            price_cache_ttl: 单币种价格缓存有效期（秒），0 表示不缓存
+            price_cache_stale_ttl: 过期价格在多少秒内先返回再后台刷新
+            price_cache_size: 价格缓存最多保存的交易对数量
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.base_url = "https://api.bitget.com"
+        self.sandbox = sandbox
+        self.log_file = log_file
+        self._signer = None
+        self._signer_credentials = None
+        
+        # 可选的 SQLite 存储后端（首次使用时打开）
+        self.storage = SQLiteStorage(storage_db) if storage_db else None
+        
+        # 追加写入的交易日志，首次使用时自动迁移旧版 trading_log.json
+        if self.storage is not None:
+            self.journal = self.storage
+        else:
+            self.journal = TradeJournal(log_file, fsync=journal_fsync,
+                                        legacy_path=os.path.join(os.path.dirname(log_file), "trading_log.json"))
+        
+        # 自动交易的资产状态（未使用 SQLite 时保存在 assets_history.jsonl，首次使用时迁移旧版 assets_history.json）
+        self.portfolio_state = PortfolioStateLog("assets_history.jsonl") if self.storage is None else None
+        
+        # 所有接口共享的 keep-alive 连接池（首次发送请求时创建）
+        self.timeout = timeout
+        self._session_options = (pool_size, max_retries, backoff_factor)
+        self._session = None
+        
+        # WebSocket 行情订阅（start_ticker_stream 启动后优先使用）
+        self.ticker_stream = None
+        
+        # 单币种价格缓存（TTL + 后台刷新 + 并发请求合并）
+        self.price_cache = PriceCache(price_cache_ttl, price_cache_stale_ttl, price_cache_size)
+        
+        # 全量行情快照 - 一次请求获取所有 USDT 永续合约的行情
+        self.ticker_snapshot = {}  # symbol -> ticker
+        self.ticker_snapshot_at = 0.0
+        self.ticker_snapshot_ttl = ticker_snapshot_ttl
+        
+        # 单币种行情、逐笔下单的并发执行与限流
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = RateLimiter({
+            "market": public_rate_limit,
+            "trade": trade_rate_limit,
+            "batch": trade_rate_limit / 2,
+            "query": public_rate_limit,
+            "account": trade_rate_limit,
+            "default": trade_rate_limit,
+        })
+        self._executor = None
+        
+        # 批量下单接口是否可用（返回404后退回逐笔下单）
+        self.batch_orders_supported = True
+        
+        # 下单重试（按 clientOid 幂等：重发前先查询订单是否已经存在）
+        self.order_retries = max(0, order_retries)
+        self.order_retry_backoff = order_retry_backoff
+        self.order_retry_max_delay = order_retry_max_delay
+        
+        # 合约交易对缓存 - 存储所有可用的合约信息（首次访问时加载）
+        self._contracts_cache = {}  # symbol -> contract_info
+        self._contracts_loaded = False
+        self._contracts_initialized = False
+        self._contracts_lock = threading.RLock()
+        self._search_index = ContractSearchIndex()
+        
+        # 后台增量刷新合约信息（start_contract_refresher 启动）
+        self._contract_refresher = None
+        self._contract_refresh_wakeup = threading.Event()
+        self._contract_refresh_stop = False
+        
+        # 合约信息存储文件
+        self.contracts_cache_file = "bitget_contracts_cache.bin"
+        self.legacy_contracts_cache_file = "bitget_contracts_cache.json"
+        
+        # 向后兼容的币种映射（已更新为正确的Bitget永续合约格式）
+        self.legacy_symbols = {
+            "BTC": "BTCUSDT",
+            "ETH": "ETHUSDT", 
+            "BNB": "BNBUSDT",
+            "ADA": "ADAUSDT",
+            "SOL": "SOLUSDT",
+            "DOGE": "DOGEUSDT",
+            "XRP": "XRPUSDT",
+            "LTC": "LTCUSDT",
+            "DOT": "DOTUSDT",
+            "MATIC": "MATICUSDT",
+            "LINK": "LINKUSDT",
+            "TSLA": "TSLAUSDT",
+            "NVDA": "NVDAUSDT"
+        }
+        
+        # 交易对解析缓存：预计算表 + 带过期时间的失败记录
+        self.symbol_miss_ttl = symbol_miss_ttl
+        self._symbol_table = {}
+        self._base_symbols = None
+        self._symbol_misses = {}  # coin -> 过期时间（monotonic）
+        self._symbol_table_source = None
+        self.symbol_stats = {"hits": 0, "misses": 0, "negative_hits": 0}
+        
+        # 每个交易对的下单精度规则（首次下单时由合约信息计算，合约信息更新后重建）
+        self._order_rules = {}
+        self._order_rules_source = None
+    
+    @property
+    def session(self) -> "requests.Session":
+        """共享的HTTP会话（首次使用时创建）"""
+        if self._session is None:
+            self._session = self._create_session(*self._session_options)
+        return self._session
+    
+    @property
+    def contracts_cache(self) -> Dict[str, Dict[str, Any]]:
+        """合约信息缓存（首次访问时从文件或API加载）"""
+        if not self._contracts_initialized:
+            self._ensure_contracts_loaded()
+        return self._contracts_cache
+    
+    @contracts_cache.setter
+    def contracts_cache(self, value: Dict[str, Dict[str, Any]]):
+        self._contracts_initialized = True
+        self._contracts_cache = value
+    
+    @property
+    def contracts_loaded(self) -> bool:
+        """合约信息是否已加载（首次访问时触发加载）"""
+        if not self._contracts_initialized:
+            self._ensure_contracts_loaded()
+        return self._contracts_loaded
+    
+    @contracts_loaded.setter
+    def contracts_loaded(self, value: bool):
+        self._contracts_initialized = True
+        self._contracts_loaded = value
+    
+    def _ensure_contracts_loaded(self, allow_network: bool = True):
+        """确保已尝试加载合约缓存"""
+        if not self._contracts_initialized:
+            with self._contracts_lock:
+                if not self._contracts_initialized:
+                    self._contracts_initialized = True
+                    self._load_contracts_cache(allow_network)
+    
+    def _create_session(self, pool_size: int, max_retries: int,
+                        backoff_factor: float) -> "requests.Session":
+        """
+        创建带连接池和重试策略的HTTP会话
+        
+        GET 请求在 429/5xx 时按退避重试；POST（下单）只在连接建立失败时重试，
+        避免服务端已收到订单后重复提交。
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry)
+        
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+    
+    def _http_get(self, path: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = None) -> "requests.Response":
+        """通过共享会话发送公共GET请求（受公共接口限流约束）"""
+        self.rate_limiter.acquire(path)
+        response = self.session.get(self.base_url + path, params=params,
+                                    timeout=timeout if timeout is not None else self.timeout)
+        self.rate_limiter.observe(path, response.status_code, response.headers)
+        return response
+    
+    def _get_executor(self) -> "ThreadPoolExecutor":
+        """获取（必要时创建）共享的并发请求线程池"""
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="bitget")
+        return self._executor
+    
+    def close(self):
+        """关闭后台刷新、WebSocket行情订阅、HTTP连接池、并发请求线程池和数据库连接"""
+        self.stop_contract_refresher()
+        self.stop_ticker_stream()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self.storage is not None:
+            self.storage.close()
+        else:
+            self.journal.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _load_contracts_cache(self, allow_network: bool = True):
+        """
+        加载合约信息缓存
+        
+        Args:
+            allow_network: 文件缓存不可用时是否从API获取
+        """
+        # 后台刷新已启动时，过期的缓存先继续使用，由后台线程增量刷新
+        background = self._contract_refresher is not None
+        
+        try:
+            # 使用 SQLite 存储时从数据库加载
+            if self.storage is not None:
+                contracts, cache_time = self.storage.load_contracts()
+                fresh = time.time() - cache_time < 24 * 3600
+                if contracts and (fresh or background):
+                    self.contracts_cache = contracts
+                    self.contracts_loaded = True
+                    print(f"📦 已从数据库加载 {len(self.contracts_cache)} 个合约缓存")
+                    if not fresh:
+                        self._contract_refresh_wakeup.set()
+                    return
+            
+            # 尝试从文件加载缓存（只读取文件头，合约详情按需解码）
+            elif os.path.exists(self.contracts_cache_file):
+                table = LazyContractTable(self.contracts_cache_file)
+                # 检查缓存是否过期（24小时）
+                fresh = time.time() - table.cached_at < 24 * 3600
+                if fresh or background:
+                    self.contracts_cache = table
+                    self.contracts_loaded = True
+                    print(f"📦 已加载 {len(self.contracts_cache)} 个合约缓存")
+                    if not fresh:
+                        self._contract_refresh_wakeup.set()
+                    return
+            
+            # 旧版JSON缓存：迁移为二进制格式
+            elif os.path.exists(self.legacy_contracts_cache_file):
+                with open(self.legacy_contracts_cache_file, 'r', encoding='utf-8') as f:
+                    cache_data = json.load(f)
+                cache_time = cache_data.get('cached_at', 0)
+                if time.time() - cache_time < 24 * 3600:
+                    write_contract_cache(self.contracts_cache_file, cache_data.get('contracts', {}), cache_time)
+                    self.contracts_cache = LazyContractTable(self.contracts_cache_file)
+                    self.contracts_loaded = True
+                    print(f"📦 已迁移 {len(self.contracts_cache)} 个合约缓存到 {self.contracts_cache_file}")
+                    return
+            
+            # 缓存不存在或已过期，从API获取
+            if not allow_network:
+                return
+            print("🔄 正在获取最新合约信息...")
+            self._refresh_contracts_cache()
+            
+        except Exception as e:
+            print(f"⚠️ 加载合约缓存失败: {str(e)}")
+            # 使用备用方案
+            self.contracts_cache = {}
+            self.contracts_loaded = False
+    
+    def _refresh_contracts_cache(self) -> Optional[Dict[str, Any]]:
+        """
+        刷新合约信息缓存
+        
+        Returns:
+            与现有缓存的差异（见 diff_contracts），刷新失败时返回 None
+        """
+        try:
+            # 获取USDT永续合约
+            response = self._http_get("/api/v2/mix/market/contracts",
+                                      params={"productType": "USDT-FUTURES"})
+            
+            data = response.json() if response.status_code == 200 else None
+            return self._store_contracts(response.status_code, data)
+                
+        except Exception as e:
+            print(f"❌ 刷新合约缓存失败: {str(e)}")
+            # 已有可用缓存时保留，不因一次刷新失败而丢弃
+            if not self._contracts_cache:
+                self.contracts_loaded = False
+            return None
+    
+    def refresh_contracts(self) -> Optional[Dict[str, Any]]:
+        """
+        立即增量刷新合约信息：只应用新增、下线和信息变化的交易对
+        
+        Returns:
+            差异（见 diff_contracts），刷新失败时返回 None
+        """
+        # 先加载本地缓存作为比较基准
+        self._ensure_contracts_loaded(allow_network=False)
+        return self._refresh_contracts_cache()
+    
+    def start_contract_refresher(self, interval: float = 300.0):
+        """
+        启动后台线程，每隔 interval 秒增量刷新一次合约信息
+        
+        启动后，过期的本地缓存在加载时不再阻塞等待刷新，而是先继续使用并立即在后台刷新。
+        """
+        if self._contract_refresher is not None:
+            return
+        self._contract_refresh_stop = False
+        self._contract_refresh_wakeup.clear()
+        
+        def run():
+            while True:
+                self._contract_refresh_wakeup.wait(interval)
+                self._contract_refresh_wakeup.clear()
+                if self._contract_refresh_stop:
+                    return
+                try:
+                    self.refresh_contracts()
+                except Exception as e:
+                    print(f"⚠️ 后台刷新合约信息失败: {str(e)}", file=sys.stderr)
+        
+        self._contract_refresher = threading.Thread(target=run, name="bitget-contracts", daemon=True)
+        self._contract_refresher.start()
+    
+    def stop_contract_refresher(self):
+        """停止后台刷新线程"""
+        if self._contract_refresher is not None:
+            self._contract_refresh_stop = True
+            self._contract_refresh_wakeup.set()
+            self._contract_refresher.join(5)
+            self._contract_refresher = None
+    
+    def _store_contracts(self, status_code: int, data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        校验合约列表响应，把变化应用到内存缓存、索引和缓存文件
+        
+        Returns:
+            与现有缓存的差异（见 diff_contracts）
+        """
+        if status_code != 200:
+            raise Exception(f"HTTP错误: {status_code}")
+        
+        if data.get('code') != '00000':
+            raise Exception(f"API错误: {data.get('msg', '未知错误')}")
+        
+        contracts = {}
+        for contract in data.get('data', []):
+            symbol = contract.get('symbol', '')
+            if symbol:
+                contracts[symbol] = self._normalize_contract(symbol, contract)
+        
+        with self._contracts_lock:
+            if self._contracts_loaded and self._contracts_cache:
+                return self._apply_contract_changes(contracts)
+            
+            # 首次加载：整体写入
+            self.contracts_cache = contracts
+            self._save_contracts(contracts)
+            self._search_index.sync(self.contracts_cache)
+            self.contracts_loaded = True
+            print(f"✅ 已缓存 {len(self.contracts_cache)} 个合约信息")
+            return {"added": list(contracts), "removed": [], "changed": {}}
+    
+    def _apply_contract_changes(self, contracts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """比较新旧合约信息，只应用变化部分（调用方持有 _contracts_lock）"""
+        old = self._contracts_cache
+        diff = diff_contracts(old, contracts)
+        now = time.time()
+        
+        if not (diff["added"] or diff["removed"] or diff["changed"]):
+            # 没有变化：只更新缓存时间
+            if self.storage is not None:
+                self.storage.apply_contract_changes({}, [], now)
+            elif isinstance(old, LazyContractTable) and os.path.exists(self.contracts_cache_file):
+                touch_contract_cache(self.contracts_cache_file, now)
+            else:
+                write_contract_cache(self.contracts_cache_file, old, now)
+            print(f"✅ 合约信息无变化（{len(old)} 个）")
+            return diff
+        
+        updated_symbols = diff["added"] + list(diff["changed"])
+        
+        # 写时复制：读取方始终看到完整的一份缓存，替换后符号解析表自动重建
+        updated = dict(old)
+        for symbol in diff["removed"]:
+            del updated[symbol]
+        for symbol in updated_symbols:
+            updated[symbol] = contracts[symbol]
+        
+        if self.storage is not None:
+            self.storage.apply_contract_changes({symbol: contracts[symbol] for symbol in updated_symbols},
+                                                diff["removed"], now)
+        else:
+            write_contract_cache(self.contracts_cache_file, updated, now)
+        
+        self.contracts_cache = updated
+        if self._search_index.source is old:
+            self._search_index.apply(updated, updated_symbols, diff["removed"])
+        # 否则索引还没有建立（或对应更早的缓存），下次搜索时按完整缓存重建
+        print(f"✅ 合约信息已更新: 新增 {len(diff['added'])} 个, 下线 {len(diff['removed'])} 个, "
+              f"变化 {len(diff['changed'])} 个")
+        return diff
+    
+    def _save_contracts(self, contracts: Dict[str, Dict[str, Any]]):
+        """保存到数据库，或文件（紧凑二进制格式，原子替换）"""
+        if self.storage is not None:
+            self.storage.save_contracts(contracts, time.time())
+        else:
+            write_contract_cache(self.contracts_cache_file, contracts, time.time())
+    
+    def _normalize_contract(self, symbol: str, contract: Dict[str, Any]) -> Dict[str, Any]:
+        """提取缓存的合约字段"""
+        return {
+            'symbol': symbol,
+            'baseCoin': contract.get('baseCoin', ''),
+            'quoteCoin': contract.get('quoteCoin', ''),
+            'minTradeNum': contract.get('minTradeNum', '0'),
+            'priceEndStep': contract.get('priceEndStep', '0'),
+            'volumePlace': contract.get('volumePlace', 0),
+            'pricePlace': contract.get('pricePlace', 0),
+            'sizeMultiplier': contract.get('sizeMultiplier', '1'),
+            'minTradeUSDT': contract.get('minTradeUSDT', '0'),
+            'maxTradeUSDT': contract.get('maxTradeUSDT', '0'),
+            'openCostUpRate': contract.get('openCostUpRate', '0'),
+            'supportMarginCoins': contract.get('supportMarginCoins', []),
+            'offTime': contract.get('offTime', ''),
+            'limitOpenTime': contract.get('limitOpenTime', ''),
+            'deliveryTime': contract.get('deliveryTime', ''),
+            'deliveryStartTime': contract.get('deliveryStartTime', ''),
+            'launchTime': contract.get('launchTime', ''),
+            'fundingTime': contract.get('fundingTime', ''),
+            'minLever': contract.get('minLever', '1'),
+            'maxLever': contract.get('maxLever', '125'),
+            'posLimit': contract.get('posLimit', '0'),
+            'maintainTime': contract.get('maintainTime', '')
+        }
+    
+    def search_contracts(self, query: str, limit: int = 20) -> list:
+        """
+        搜索合约交易对
+        
+        Args:
+            query: 搜索关键字
+            limit: 返回结果数量限制
+            
+        Returns:
+            匹配的合约列表
+        """
+        if not self.contracts_loaded:
+            self._refresh_contracts_cache()
+        
+        return self._search_loaded_contracts(query, limit)
+    
+    def _search_loaded_contracts(self, query: str, limit: int = 20) -> list:
+        """在已加载的合约缓存中搜索（不触发网络请求）"""
+        if not self.contracts_cache:
+            return []
+        
+        # 后台刷新线程可能同时更新缓存和索引
+        with self._contracts_lock:
+            contracts = self.contracts_cache
+            # contracts_cache 被整体替换后增量同步索引
+            if self._search_index.source is not contracts:
+                self._search_index.sync(contracts)
+            
+            symbols = self._search_index.search(query.upper().strip(), limit)
+        return [self._contract_search_result(symbol, contracts[symbol]) for symbol in symbols]
+    
+    def _contract_search_result(self, symbol: str, contract: Dict[str, Any]) -> Dict[str, Any]:
+        """构造单个搜索结果"""
+        return {
+            'symbol': symbol,
+            'baseCoin': contract.get('baseCoin', ''),
+            'quoteCoin': contract.get('quoteCoin', ''),
+            'displayName': f"{contract.get('baseCoin', '')}/{contract.get('quoteCoin', '')} 永续 ({symbol})",
+            'minTradeNum': contract.get('minTradeNum', '0'),
+            'pricePlace': contract.get('pricePlace', 0),
+            'volumePlace': contract.get('volumePlace', 0),
+            'minTradeUSDT': contract.get('minTradeUSDT', '0'),
+            'maxLever': contract.get('maxLever', '125'),
+            'contractInfo': contract  # 完整合约信息
+        }
+    
+    def get_contract_info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        获取指定交易对的合约信息
+        
+        Args:
+            symbol: 交易对符号
+            
+        Returns:
+            合约信息字典，如果不存在返回None
+        """
+        if not self.contracts_loaded:
+            self._refresh_contracts_cache()
+        
+        return self.contracts_cache.get(symbol)
+    
+    def _log_trade(self, trade_info: Dict[str, Any]):
+        """记录交易日志"""
+        self._log_trades([trade_info])
+    
+    def _log_trades(self, trade_infos: list):
+        """批量记录交易日志（追加写入）"""
+        if not trade_infos:
+            return
+        
+        try:
+            # 添加交易记录
+            trade_records = [
+                {
+                    "timestamp": datetime.now().isoformat(),
+                    "trade_id": new_id("trade"),
+                    **trade_info
+                }
+                for trade_info in trade_infos
+            ]
+            
+            self.journal.append(trade_records)
+            
+            for trade_record in trade_records:
+                print(f"📝 交易日志已记录: {trade_record['trade_id']}")
+            
+        except Exception as e:
+            print(f"❌ 记录交易日志失败: {str(e)}")
+    
+    def auto_trade_based_on_portfolio_change(self, assets_file: str = "assets.json"):
+        """
+        基于投资组合变化自动交易
+        
+        资产文件的 mtime 和大小与上次相同时直接跳过，不读取文件；
+        内容哈希相同时只记录新的文件指纹；否则只比较内容哈希变化的币种，
+        状态按币种增量保存。
+        
+        Args:
+            assets_file: 资产文件路径
+        """
+        try:
+            # 先取时间再 stat：之后的修改一定会让 mtime 晚于 checked_ns
+            checked_ns = time.time_ns()
+            stat = os.stat(assets_file)
+            state = self._load_portfolio_state(assets_file)
+            source = state['source'] if state else None
+            if self._portfolio_source_unchanged(source, stat):
+                print("✅ 资产文件未变化，跳过")
+                return
+            
+            # 读取当前资产文件
+            with open(assets_file, 'rb') as f:
+                raw = f.read()
+            new_source = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": hashlib.blake2b(raw, digest_size=16).hexdigest(),
+                "checked_ns": checked_ns
+            }
+            if source and source.get('hash') == new_source['hash']:
+                self._save_portfolio_state(assets_file, new_source, {}, [])
+                print("✅ 资产文件内容未变化，跳过")
+                return
+            
+            current_assets = hash_portfolio_assets(json.loads(raw.decode('utf-8')).get('crypto', []))
+            if state is None:
+                # 如果没有历史快照，创建当前快照
+                self._save_portfolio_state(assets_file, new_source, current_assets, [], reset=True)
+                print("📁 创建历史资产快照")
+                return
+            
+            # 只分析内容哈希变化的币种
+            upserts, removed = diff_portfolio_assets(state['assets'], current_assets)
+            history_assets = state['assets']
+            crypto_changes = self._analyze_portfolio_changes(
+                [{'name': coin, 'quantity': history_assets[coin]['quantity']}
+                 for coin in list(upserts) + removed if coin in history_assets],
+                [{'name': coin, 'quantity': asset['quantity']} for coin, asset in upserts.items()]
+            )
+            
+            if crypto_changes:
+                print(f"🔄 检测到 {len(crypto_changes)} 个币种数量变化")
+                self._execute_portfolio_trades(crypto_changes)
+                
+                # 更新历史快照
+                self._save_portfolio_state(assets_file, new_source, upserts, removed)
+                print("✅ 历史资产快照已更新")
+            else:
+                self._save_portfolio_state(assets_file, new_source, upserts, removed)
+                print("✅ 没有检测到数量变化")
+                
+        except Exception as e:
+            print(f"❌ 自动交易失败: {str(e)}")
+
+    def watch_portfolio(self, assets_file: str = "assets.json", debounce: float = 0.2,
+                        poll_interval: float = 1.0, use_inotify: bool = True,
+                        stop_event: Optional[threading.Event] = None):
+        """
+        常驻监视资产文件，每次保存后立即执行 auto_trade_based_on_portfolio_change
+        
+        启动时先执行一次并预热合约信息和连接池，之后只在文件写入平静 debounce 秒后运行；
+        内容没有真正变化时由内容哈希直接跳过。合约信息由后台线程定期增量刷新。
+        
+        Args:
+            assets_file: 资产文件路径
+            debounce: 最后一次写入后等待多少秒再分析
+            poll_interval: 不能使用 inotify 时轮询 stat 的间隔（秒）
+            use_inotify: 是否尝试使用 inotify
+            stop_event: 设置后退出监视（默认一直运行到 Ctrl+C）
+        """
+        watcher = FileWatcher(assets_file, debounce=debounce, poll_interval=poll_interval,
+                              use_inotify=use_inotify)
+        print(f"👀 监视资产文件 {assets_file}（{watcher.backend}，防抖 {debounce} 秒）")
+        
+        try:
+            self.auto_trade_based_on_portfolio_change(assets_file)
+            try:
+                self._ensure_contracts_loaded()
+            except Exception as e:
+                print(f"⚠️ 预热失败: {str(e)}")
+            if self._contract_refresher is None:
+                self.start_contract_refresher()
+            
+            while stop_event is None or not stop_event.is_set():
+                # 定时返回以便检查 stop_event
+                if not watcher.wait(timeout=1.0):
+                    continue
+                print(f"\n📝 {time.strftime('%H:%M:%S')} 资产文件已修改")
+                self.auto_trade_based_on_portfolio_change(assets_file)
+        except KeyboardInterrupt:
+            print("\n🛑 停止监视")
+        finally:
+            watcher.close()
+    
+    @staticmethod
+    def _portfolio_source_unchanged(source: Optional[Dict[str, Any]], stat: os.stat_result) -> bool:
+        """
+        文件的 mtime 和大小与记录的指纹相同，且记录时文件已经至少2秒没有修改
+        （mtime 精度有限，刚修改过的文件即使指纹相同也要重新计算哈希）
+        """
+        if not source or source.get('mtime_ns') != stat.st_mtime_ns or source.get('size') != stat.st_size:
+            return False
+        return source.get('checked_ns', 0) - stat.st_mtime_ns > 2_000_000_000
+    
+    def _load_portfolio_state(self, assets_file: str) -> Optional[Dict[str, Any]]:
+        """
+        读取自动交易资产状态（数据库或 assets_history.jsonl），
+        还没有状态时从旧版完整快照迁移，都不存在时返回 None
+        """
+        if self.storage is not None:
+            state = self.storage.load_portfolio_state(assets_file)
+        else:
+            state = self.portfolio_state.load()
+        if state is not None:
+            return state
+        
+        legacy = self._load_assets_snapshot(assets_file)
+        if legacy is None:
+            return None
+        assets = hash_portfolio_assets(legacy.get('crypto', []))
+        self._save_portfolio_state(assets_file, None, assets, [], reset=True)
+        return {"source": None, "assets": assets}
+    
+    def _save_portfolio_state(self, assets_file: str, source: Optional[Dict[str, Any]],
+                              upserts: Dict[str, Dict[str, Any]], removed: list, reset: bool = False):
+        """增量保存资产状态（只写入变化的币种和新的文件指纹）"""
+        if self.storage is not None:
+            self.storage.apply_portfolio_changes(assets_file, source, upserts, removed, reset=reset)
+        else:
+            self.portfolio_state.apply(source, upserts, removed, reset=reset)
+    
+    def _load_assets_snapshot(self, assets_file: str) -> Optional[Dict[str, Any]]:
+        """读取旧版完整资产快照（数据库或 assets_history.json），不存在时返回 None"""
+        if self.storage is not None:
+            return self.storage.latest_snapshot(assets_file)
+        
+        history_file = "assets_history.json"
+        if not os.path.exists(history_file):
+            return None
+        with open(history_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _analyze_portfolio_changes(self, history_crypto: list, current_crypto: list) -> list:
+        """分析投资组合变化"""
+        changes = []
+        
+        # 创建历史数据的索引
+        history_dict = {item['name'].upper(): item for item in history_crypto}
+        current_dict = {item['name'].upper(): item for item in current_crypto}
+        
+        # 检查所有币种的变化
+        all_coins = set(history_dict.keys()) | set(current_dict.keys())
+        
+        for coin in all_coins:
+            history_qty = history_dict.get(coin, {}).get('quantity', 0)
+            current_qty = current_dict.get(coin, {}).get('quantity', 0)
+            
+            if abs(current_qty - history_qty) > 0.000001:  # 考虑浮点精度
+                change = current_qty - history_qty
+                changes.append({
+                    'coin': coin,
+                    'old_quantity': history_qty,
+                    'new_quantity': current_qty,
+                    'change': change,
+                    'action': 'buy' if change > 0 else 'sell',
+                    'size': abs(change)
+                })
+        
+        return changes
+    
+    def _execute_portfolio_trades(self, changes: list):
+        """执行投资组合交易（一次批量下单，日志统一写入）"""
+        orders = []
+        for change in changes:
+            print(f"\n🔄 执行交易: {change['action'].upper()} {change['size']} {change['coin']}")
+            orders.append({
+                "coin": change['coin'],
+                "side": change['action'],
+                "size": str(change['size'])
+            })
+        
+        # 每笔订单的结果只在这里记录一次，重试过程由 OrderRetry 记为 retry
+        results = self.place_orders_batch(orders, log_outcome=False)
+        
+        trade_infos = []
+        for change, result in zip(changes, results):
+            coin = change['coin']
+            action = change['action']
+            size = change['size']
+            
+            trade_info = {
+                "coin": coin,
+                "action": action,
+                "size": size,
+                "old_quantity": change['old_quantity'],
+                "new_quantity": change['new_quantity'],
+                "status": "success" if result['success'] else "failed"
+            }
+            if result.get('clientOid'):
+                trade_info["clientOid"] = result['clientOid']
+            if 'attempts' in result:
+                trade_info["attempts"] = result['attempts']
+            if result.get('recovered'):
+                trade_info["recovered"] = True
+            
+            if 'error' in result:
+                print(f"❌ 交易执行失败: {result['error']}")
+                trade_info["error"] = result['error']
+            else:
+                trade_info["api_response"] = {
+                    "status_code": result['status_code'],
+                    "response": result['response']
+                }
+                if result['success']:
+                    print(f"✅ {action.upper()} {size} {coin} 成功")
+                else:
+                    print(f"❌ {action.upper()} {size} {coin} 失败")
+            
+            trade_infos.append(trade_info)
+        
+        self._log_trades(trade_infos)
+    
+    def get_trading_log(self, limit: int = 50, coin: Optional[str] = None,
+                        status: Optional[str] = None, action: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None,
+                        cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取交易日志（从日志末尾向前读取）
+        
+        Args:
+            limit: 返回的记录数量
+            coin: 按币种过滤
+            status: 按状态过滤 (success/failed/retry/recovered)
+            action: 按方向过滤 (buy/sell)
+            since: 起始时间（ISO格式，包含）
+            until: 结束时间（ISO格式，不包含）
+            cursor: 分页游标（上一次结果中的 next_cursor）
+        """
+        try:
+            if any((coin, status, action, since, until, cursor)):
+                page = self.journal.query(limit, coin=coin, status=status, action=action,
+                                          since=since, until=until, cursor=cursor)
+                recent_records = page['records']
+                next_cursor = page['next_cursor']
+            else:
+                recent_records = self.journal.tail(limit)
+                next_cursor = None
+            
+            latest = next(self.journal.iter_reverse(), (None, {}))[1]
+            
+            return {
+                "total_records": self.journal.count(),
+                "recent_records": recent_records,
+                "next_cursor": next_cursor,
+                "last_updated": latest.get('timestamp', '')
+            }
+            
+        except Exception as e:
+            return {
+                "error": f"读取交易日志失败: {str(e)}"
+            }
+    
+    def clear_trading_log(self):
+        """清空交易日志"""
+        try:
+            self.journal.clear()
+            print("🗑️ 交易日志已清空")
+            
+        except Exception as e:
+            print(f"❌ 清空交易日志失败: {str(e)}")
+    
+    def compact_trading_log(self, keep_last: Optional[int] = None):
+        """合并交易日志分段"""
+        try:
+            count = self.journal.compact(keep_last)
+            print(f"🗜️ 交易日志已合并，共 {count} 条记录")
+            
+        except Exception as e:
+            print(f"❌ 合并交易日志失败: {str(e)}")
+    
+    @property
+    def signer(self) -> RequestSigner:
+        """请求签名器（首次使用或API凭证变更时创建）"""
+        credentials = (self.api_key, self.secret_key, self.passphrase)
+        if self._signer is None or self._signer_credentials != credentials:
+            self._signer = RequestSigner(*credentials)
+            self._signer_credentials = credentials
+        return self._signer
+    
+    def _generate_signature(self, timestamp: str, method: str, 
+                          request_path: str, body: str) -> str:
+        """生成API签名"""
+        return self.signer.signature(timestamp, method, request_path, body)
+    
+    def _sign_request(self, method: str, endpoint: str, data: Dict[str, Any]) -> tuple:
+        """
+        序列化请求体并生成签名请求头
+        
+        Returns:
+            (headers, body) 元组
+        """
+        return self.signer.sign(method, endpoint, data)
+    
+    def _make_request(self, method: str, endpoint: str, data: Dict[str, Any],
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """发送API请求（按接口类别限流）"""
+        self.rate_limiter.acquire(endpoint)
+        headers, body = self._sign_request(method, endpoint, data)
+        
+        url = self.base_url + endpoint
+        response = self.session.request(method, url, headers=headers, data=body,
+                                        timeout=timeout if timeout is not None else self.timeout)
+        self.rate_limiter.observe(endpoint, response.status_code, response.headers)
+        
+        return {
+            "status_code": response.status_code,
+            "response": response.json() if response.text else {}
+        }
+    
+    def _build_symbol_table(self) -> Dict[str, str]:
+        """
+        初始化 币种/交易对 -> 交易对 的解析表
+        
+        预先放入向后兼容映射（被真实合约符号覆盖的除外），其余结果在首次解析后写入。
+        """
+        return {
+            coin: symbol for coin, symbol in self.legacy_symbols.items()
+            if not (self.contracts_loaded and coin in self.contracts_cache)
+        }
+    
+    def _base_symbol_map(self) -> Dict[str, str]:
+        """baseCoin -> 交易对 的预计算表（首次需要按 baseCoin 解析时构建）"""
+        if self._base_symbols is None:
+            if self._search_index.source is not self.contracts_cache:
+                self._search_index.sync(self.contracts_cache)
+            self._base_symbols = self._search_index.first_by_base()
+        return self._base_symbols
+    
+    def _get_symbol(self, coin: str) -> str:
+        """
+        获取交易对符号 - 新版本支持完整合约信息
+        
+        先查解析表，未命中时走完整解析流程并记住结果；
+        解析失败的币种在 symbol_miss_ttl 秒内直接判定失败，不再重复搜索。
+        
+        Args:
+            coin: 币种符号或完整交易对
+            
+        Returns:
+            有效的交易对符号
+        """
+        coin_upper = coin.upper().strip()
+        
+        # 合约缓存被替换或加载状态变化后重建解析表
+        source = (self.contracts_cache, self.contracts_loaded)
+        if self._symbol_table_source is None or \
+                self._symbol_table_source[0] is not source[0] or self._symbol_table_source[1] != source[1]:
+            self._symbol_table = self._build_symbol_table()
+            self._base_symbols = None
+            self._symbol_misses = {}
+            self._symbol_table_source = source
+        
+        symbol = self._symbol_table.get(coin_upper)
+        if symbol is not None:
+            self.symbol_stats["hits"] += 1
+            return symbol
+        
+        expires_at = self._symbol_misses.get(coin_upper)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self.symbol_stats["negative_hits"] += 1
+                raise ValueError(f"未找到币种: {coin}. 请使用完整的交易对符号（如BTCUSDT）或确保合约信息已加载")
+            del self._symbol_misses[coin_upper]
+        
+        self.symbol_stats["misses"] += 1
+        try:
+            symbol = self._resolve_symbol_uncached(coin_upper)
+        except ValueError:
+            now = time.monotonic()
+            if len(self._symbol_misses) >= 1024:
+                self._symbol_misses = {k: v for k, v in self._symbol_misses.items() if v > now}
+            self._symbol_misses[coin_upper] = now + self.symbol_miss_ttl
+            raise ValueError(f"未找到币种: {coin}. 请使用完整的交易对符号（如BTCUSDT）或确保合约信息已加载")
+        
+        self._symbol_table[coin_upper] = symbol
+        return symbol
+    
+    def symbol_cache_stats(self) -> Dict[str, int]:
+        """符号解析缓存的命中统计"""
+        return {
+            **self.symbol_stats,
+            "table_size": len(self._symbol_table),
+            "negative_size": len(self._symbol_misses)
+        }
+    
+    def _resolve_symbol_uncached(self, coin_upper: str) -> str:
+        """完整的交易对解析流程（不经过缓存）"""
+        # 1. 直接检查是否为有效的合约符号
+        if self.contracts_loaded and coin_upper in self.contracts_cache:
+            return coin_upper
+        
+        # 2. 检查向后兼容的映射
+        if coin_upper in self.legacy_symbols:
+            return self.legacy_symbols[coin_upper]
+        
+        # 3. 如果以USDT结尾，直接检查是否为有效的永续合约
+        if coin_upper.endswith("USDT"):
+            if self.contracts_loaded and coin_upper in self.contracts_cache:
+                return coin_upper
+            # 如果不是完整符号，但以USDT结尾，可能是现货，直接返回
+            return coin_upper
+        
+        # 4. 尝试搜索合约（baseCoin 完全匹配即为搜索结果第一名，直接查表）
+        if self.contracts_loaded:
+            symbol = self._base_symbol_map().get(coin_upper)
+            if symbol is not None:
+                return symbol
+            matches = self._search_loaded_contracts(coin_upper, limit=1)
+            if matches:
+                return matches[0]['symbol']
+        
+        # 5. 最后尝试构造USDT永续合约符号
+        constructed_symbol = f"{coin_upper}USDT"
+        if self.contracts_loaded and constructed_symbol in self.contracts_cache:
+            return constructed_symbol
+        
+        # 如果都没有找到，抛出错误
+        raise ValueError(f"未找到币种: {coin_upper}. 请使用完整的交易对符号（如BTCUSDT）或确保合约信息已加载")
+    
+    def place_market_order(self, coin: str, side: str, size: str,
+                          margin_mode: str = "crossed", leverage: str = "1") -> Dict[str, Any]:
+        """
+        下市价单（统一账户 V3）
+
+        Args:
+            coin: 币种 (如 BTC, ETH 或 BTCUSDT)
+            side: 方向 (buy/sell)
+            size: 数量
+            margin_mode: 保证金模式 (crossed/isolated)
+            leverage: 杠杆倍数 (1-125)
+        """
+        order_data = self._build_market_order(coin, side, size, margin_mode)
+        symbol = order_data["symbol"]
+
+        if leverage != "1":
+            print(f"🔄 设置 {symbol} 杠杆为 {leverage}x...")
+            self._set_leverage(symbol, margin_mode, leverage)
+
+        return self._submit_order(order_data)
+    
+    def _build_market_order(self, coin: str, side: str, size: str,
+                            margin_mode: str = "crossed") -> Dict[str, Any]:
+        """构造市价单请求体（数量按合约精度规整，不合法时抛出 ValueError）"""
+        symbol = self._get_symbol(coin)
+        qty, _ = self._normalize_order(symbol, side, size)
+
+        return {
+            "category":    "USDT-FUTURES",
+            "symbol":      symbol,
+            "orderType":   "market",
+            "side":        side,
+            "qty":         qty,
+            "marginMode":  margin_mode,
+            "timeInForce": "ioc",
+            "clientOid":   new_id("market")
+        }
+    
+    def _build_leverage_request(self, symbol: str, margin_mode: str, leverage: str) -> Dict[str, Any]:
+        """构造设置杠杆请求体"""
+        return {
+            "category":   "USDT-FUTURES",
+            "symbol":     symbol,
+            "marginMode": margin_mode,
+            "leverage":   str(leverage)
+        }
+    
+    def place_market_order_with_contract_info(self, symbol: str, side: str, size: str,
+                                            contract_info: Optional[Dict[str, Any]] = None,
+                                            margin_mode: str = "crossed", leverage: str = "1") -> Dict[str, Any]:
+        """
+        使用合约信息下市价单（推荐使用此方法，统一账户 V3）
+
+        Args:
+            symbol: 完整的交易对符号 (如 BTCUSDT)
+            side: 方向 (buy/sell)
+            size: 数量
+            contract_info: 合约信息（如果提供则不需要查询）
+            margin_mode: 保证金模式 (crossed/isolated)
+            leverage: 杠杆倍数 (1-125)
+        """
+        # 获取合约信息
+        if contract_info is None:
+            contract_info = self.get_contract_info(symbol)
+            if not contract_info:
+                raise ValueError(f"未找到交易对 {symbol} 的合约信息")
+
+        # 按合约精度规整数量（不合法时在本地拒绝）
+        rule = OrderRule(symbol, contract_info)
+        size, _ = rule.normalize(side, size)
+        min_trade_num = contract_info.get('minTradeNum', '0')
+
+        order_data = {
+            "category":    "USDT-FUTURES",
+            "symbol":      symbol,
+            "orderType":   "market",
+            "side":        side,
+            "qty":         size,
+            "marginMode":  margin_mode,
+            "timeInForce": "ioc",
+            "clientOid":   new_id("market")
+        }
+
+        if leverage != "1":
+            print(f"🔄 设置 {symbol} 杠杆为 {leverage}x...")
+            self._set_leverage(symbol, margin_mode, leverage)
+
+        print(f"📊 合约信息: {contract_info.get('baseCoin', '')}/{contract_info.get('quoteCoin', '')} - 最小数量: {min_trade_num}")
+
+        return self._submit_order(order_data)
+    
+    def _set_leverage(self, symbol: str, margin_mode: str, leverage: str) -> Dict[str, Any]:
+        """设置杠杆倍数（统一账户 V3）"""
+        leverage_data = self._build_leverage_request(symbol, margin_mode, leverage)
+        return self._make_request("POST", "/api/v3/account/set-leverage", leverage_data)
+    
+    def place_limit_order(self, coin: str, side: str, size: str, price: str,
+                         margin_mode: str = "crossed",
+                         force: str = "gtc") -> Dict[str, Any]:
+        """
+        下限价单（统一账户 V3）
+
+        Args:
+            coin: 币种 (如 BTC, ETH 或 BTCUSDT)
+            side: 方向 (buy/sell)
+            size: 数量
+            price: 价格
+            margin_mode: 保证金模式 (crossed/isolated)
+            force: 订单有效期 (gtc/ioc/fok/post_only)
+        """
+        order_data = self._build_limit_order(coin, side, size, price, margin_mode, force)
+        return self._submit_order(order_data)
+    
+    def _build_limit_order(self, coin: str, side: str, size: str, price: str,
+                           margin_mode: str = "crossed", force: str = "gtc") -> Dict[str, Any]:
+        """构造限价单请求体（数量和价格按合约精度规整，不合法时抛出 ValueError）"""
+        symbol = self._get_symbol(coin)
+        if price is None or price == '':
+            raise ValueError("限价单需要价格")
+        qty, price = self._normalize_order(symbol, side, size, price)
+
+        return {
+            "category":    "USDT-FUTURES",
+            "symbol":      symbol,
+            "orderType":   "limit",
+            "side":        side,
+            "qty":         qty,
+            "price":       price,
+            "marginMode":  margin_mode,
+            "timeInForce": force,
+            "clientOid":   new_id("limit")
+        }
+    
+    def close_position(self, coin: str, side: str, size: str,
+                      order_type: str = "market", price: Optional[str] = None,
+                      margin_mode: str = "crossed") -> Dict[str, Any]:
+        """
+        平仓（统一账户 V3，reduceOnly=yes）
+
+        Args:
+            coin: 币种
+            side: 平仓方向 (buy/sell)
+            size: 平仓数量
+            order_type: 订单类型 (market/limit)
+            price: 限价单价格(仅限价单需要)
+            margin_mode: 保证金模式 (crossed/isolated)
+        """
+        order_data = self._build_close_order(coin, side, size, order_type, price, margin_mode)
+        return self._submit_order(order_data)
+    
+    def _build_close_order(self, coin: str, side: str, size: str,
+                           order_type: str = "market", price: Optional[str] = None,
+                           margin_mode: str = "crossed") -> Dict[str, Any]:
+        """构造平仓单请求体（数量和价格按合约精度规整，不合法时抛出 ValueError）"""
+        symbol = self._get_symbol(coin)
+        if order_type == "limit" and (price is None or price == ''):
+            raise ValueError("限价平仓需要价格")
+        qty, price = self._normalize_order(symbol, side, size,
+                                           price if order_type == "limit" else None, reduce_only=True)
+
+        order_data = {
+            "category":    "USDT-FUTURES",
+            "symbol":      symbol,
+            "orderType":   order_type,
+            "side":        side,
+            "qty":         qty,
+            "marginMode":  margin_mode,
+            "reduceOnly":  "yes",
+            "timeInForce": "ioc" if order_type == "market" else "gtc",
+            "clientOid":   new_id("close")
+        }
+
+        if price is not None:
+            order_data["price"] = price
+
+        return order_data
+    
+    def _order_rule(self, symbol: str) -> Optional[OrderRule]:
+        """交易对的下单精度规则（按交易对缓存，合约信息被替换后重建），没有合约信息时返回 None"""
+        contracts = self.contracts_cache
+        if self._order_rules_source is not contracts:
+            self._order_rules = {}
+            self._order_rules_source = contracts
+        
+        rule = self._order_rules.get(symbol)
+        if rule is None:
+            contract = contracts.get(symbol) if self.contracts_loaded else None
+            if contract is None:
+                return None
+            rule = self._order_rules[symbol] = OrderRule(symbol, contract)
+        return rule
+    
+    def _normalize_order(self, symbol: str, side: str, size, price=None,
+                         reduce_only: bool = False) -> tuple:
+        """
+        按合约精度规整数量和价格，不合法的订单在发送前拒绝
+        
+        市价单用 WebSocket 行情或价格缓存中的价格（不发请求）检查名义价值限额。
+        没有合约信息时只检查数值是否为正数。
+        
+        Returns:
+            (数量字符串, 价格字符串或 None)
+        """
+        if side not in ("buy", "sell"):
+            raise ValueError(f"无效的方向: {side}")
+        
+        rule = self._order_rule(symbol)
+        if rule is None:
+            qty = to_decimal(size)
+            if qty <= 0:
+                raise ValueError(f"{symbol} 数量必须大于0: {size}")
+            if price is None:
+                return format(qty, 'f'), None
+            limit_price = to_decimal(price)
+            if limit_price <= 0:
+                raise ValueError(f"{symbol} 价格必须大于0: {price}")
+            return format(qty, 'f'), format(limit_price, 'f')
+        
+        reference_price = None
+        if price is None:
+            cached = self._stream_price(symbol) or self.price_cache.lookup(symbol)
+            if cached is not None and cached.get('success'):
+                reference_price = cached['price']
+        return rule.normalize(side, size, price, reference_price=reference_price, reduce_only=reduce_only)
+    
+    def _resolve_price_symbol(self, coin: str) -> str:
+        """解析行情查询用的交易对，解析失败时直接使用原始输入"""
+        try:
+            return self._get_symbol(coin)
+        except ValueError:
+            return coin.upper().strip()
+    
+    def _ticker_to_price_info(self, symbol: str, ticker: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将行情数据转换为统一的价格信息格式
+        
+        涨跌幅、成交量为空（"" 或 null）时按0处理；价格无法解析时只让该交易对失败，
+        返回 {"success": False, "error": ...}，不影响同一批中的其他币种。
+        """
+        def optional(value) -> float:
+            return 0.0 if value is None or value == '' else float(value)
+        
+        try:
+            # WebSocket 行情没有 chgUtcRate，使用 changeUtc24h / change24h
+            change_rate = ticker.get('chgUtcRate', ticker.get('changeUtc24h', ticker.get('change24h')))
+            return {
+                "success": True,
+                "symbol": symbol,
+                "price": float(ticker.get('lastPr', 0)),
+                "price_change_24h": optional(ticker.get('chgUTC')),
+                "price_change_percent_24h": optional(change_rate) * 100,
+                "volume_24h": optional(ticker.get('baseVolume')),
+                "timestamp": ticker.get('ts', ''),
+                "market_type": "futures"
+            }
+        except (TypeError, ValueError) as e:
+            return {
+                "success": False,
+                "symbol": symbol,
+                "error": f"行情数据格式错误: {symbol} ({str(e)})"
+            }
+    
+    def _build_order(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        根据订单描述构造下单请求体
+        
+        Args:
+            order: {"coin", "side", "size", 可选 "order_type"(market/limit/close),
+                    "price", "margin_mode", "force"}
+        """
+        order_type = order.get('order_type', 'market')
+        margin_mode = order.get('margin_mode', 'crossed')
+        
+        if order_type == 'market':
+            return self._build_market_order(order['coin'], order['side'], order['size'], margin_mode)
+        if order_type == 'limit':
+            return self._build_limit_order(order['coin'], order['side'], order['size'], order['price'],
+                                           margin_mode, order.get('force', 'gtc'))
+        if order_type == 'close':
+            return self._build_close_order(order['coin'], order['side'], order['size'],
+                                           order.get('close_type', 'market'), order.get('price'),
+                                           margin_mode)
+        raise ValueError(f"不支持的订单类型: {order_type}")
+    
+    def place_orders_batch(self, orders: list, log_outcome: bool = True) -> list:
+        """
+        批量下单（统一账户 V3）
+        
+        优先使用批量下单接口（每批最多 BATCH_ORDER_LIMIT 笔），
+        接口不可用时退回并发逐笔下单。
+        
+        Args:
+            orders: 订单描述列表，格式见 _build_order
+            log_outcome: 发生重试的订单是否把最终结果记入交易日志（调用方自己记录时传 False）
+            
+        Returns:
+            与 orders 一一对应的结果列表，每项包含 success、symbol、clientOid，
+            以及 status_code/response（已发送）或 error（本地构造失败）；
+            发生过重试的订单还包含 attempts，通过查询找回的订单包含 recovered
+        """
+        results = [None] * len(orders)
+        prepared = []  # (index, order_data)
+        
+        for index, order in enumerate(orders):
+            try:
+                prepared.append((index, self._build_order(order)))
+            except Exception as e:
+                results[index] = {
+                    "success": False,
+                    "symbol": None,
+                    "clientOid": None,
+                    "error": str(e)
+                }
+        
+        if self.batch_orders_supported:
+            for start in range(0, len(prepared), BATCH_ORDER_LIMIT):
+                chunk = prepared[start:start + BATCH_ORDER_LIMIT]
+                chunk_results = self._place_batch_chunk([order_data for _, order_data in chunk], log_outcome)
+                if chunk_results is None:
+                    # 批量接口不可用，剩余订单改为逐笔
+                    prepared = prepared[start:]
+                    break
+                for (index, _), result in zip(chunk, chunk_results):
+                    results[index] = result
+            else:
+                prepared = []
+        
+        if prepared:
+            single_results = self._place_orders_concurrently([order_data for _, order_data in prepared],
+                                                             log_outcome=log_outcome)
+            for (index, _), result in zip(prepared, single_results):
+                results[index] = result
+        
+        return results
+    
+    def _place_batch_chunk(self, order_list: list, log_outcome: bool = True) -> Optional[list]:
+        """
+        通过批量接口提交一批订单
+        
+        Returns:
+            每笔订单的结果列表；批量接口不存在时返回 None
+        """
+        try:
+            result = self._make_request("POST", "/api/v3/trade/place-batch", order_list)
+        except Exception as e:
+            # 请求结果未知：逐笔按 clientOid 查询，已存在的订单不会重复提交
+            print(f"⚠️ 批量下单结果未知，逐笔核对后重试: {str(e)}")
+            return self._place_orders_concurrently(order_list, lookup_first=True, log_outcome=log_outcome)
+        
+        status_code = result['status_code']
+        response = result['response']
+        
+        if status_code == 404:
+            print("⚠️ 批量下单接口不可用，改为并发逐笔下单")
+            self.batch_orders_supported = False
+            return None
+        
+        if status_code in ORDER_RETRY_STATUS:
+            # 整批被限流或服务端出错：逐笔重试，5xx 时订单可能已经创建，先按 clientOid 查询
+            print(f"⚠️ 批量下单HTTP错误 {status_code}，改为逐笔重试")
+            return self._place_orders_concurrently(order_list, lookup_first=status_code != 429,
+                                                   log_outcome=log_outcome)
+        
+        if status_code != 200 or response.get('code') != '00000':
+            return [self._order_result(order_data, status_code, response) for order_data in order_list]
+        
+        # 按 clientOid 匹配每笔订单的结果
+        data = response.get('data') or []
+        if isinstance(data, dict):
+            items = [dict(item, code='00000') for item in data.get('successList') or []]
+            items += [dict(item, code=item.get('errorCode', item.get('code', ''))) for item in data.get('failureList') or []]
+        else:
+            items = data
+        by_client_oid = {item.get('clientOid'): item for item in items if isinstance(item, dict)}
+        
+        results = [None] * len(order_list)
+        missing = []  # 响应中没有结果的订单下标
+        for index, order_data in enumerate(order_list):
+            item = by_client_oid.get(order_data['clientOid'])
+            if item is None:
+                missing.append(index)
+                continue
+            item_response = {
+                "code": item.get('code') or '00000',
+                "msg": item.get('msg') or item.get('errorMsg') or 'success',
+                "data": item
+            }
+            results[index] = self._order_result(order_data, status_code, item_response)
+        
+        if missing:
+            # 结果未知：逐笔按 clientOid 查询，已存在的订单不会重复提交
+            print(f"⚠️ 批量下单响应中缺少 {len(missing)} 笔订单，逐笔核对后重试")
+            retried = self._place_orders_concurrently([order_list[index] for index in missing],
+                                                      lookup_first=True, log_outcome=log_outcome)
+            for index, result in zip(missing, retried):
+                results[index] = result
+        return results
+    
+    def _place_orders_concurrently(self, order_list: list, lookup_first: bool = False,
+                                   log_outcome: bool = True) -> list:
+        """
+        并发逐笔提交订单
+        
+        Args:
+            order_list: 下单请求体列表
+            lookup_first: 是否先按 clientOid 查询订单（之前的提交结果未知时使用）
+            log_outcome: 发生重试的订单是否把最终结果记入交易日志
+        """
+        def place(order_data):
+            try:
+                result = self._submit_order(order_data, lookup_first=lookup_first, log_outcome=log_outcome)
+                order_result = self._order_result(order_data, result['status_code'], result['response'])
+                if result.get('attempts', 1) > 1:
+                    order_result["attempts"] = result['attempts']
+                if result.get('recovered'):
+                    order_result["recovered"] = True
+                return order_result
+            except Exception as e:
+                return self._order_result(order_data, 0, {}, error=f"网络请求失败: {str(e)}")
+        
+        if len(order_list) <= 1:
+            return [place(order_data) for order_data in order_list]
+        return list(self._get_executor().map(place, order_list))
+    
+    def _submit_order(self, order_data: Dict[str, Any], lookup_first: bool = False,
+                      log_outcome: bool = True) -> Dict[str, Any]:
+        """
+        提交单笔订单，网络失败或 429/5xx 时按 clientOid 幂等重试
+        
+        请求可能已经到达服务端时（超时、连接中断、5xx），重发前先按 clientOid
+        查询订单，已存在则直接返回该订单；每次重试都使用同一个 clientOid。
+        发生过重试的订单，每次重试都记入交易日志（status=retry）。
+        
+        Args:
+            order_data: 下单请求体
+            lookup_first: 首次提交前是否先查询（之前的提交结果未知时使用）
+            log_outcome: 是否把重试后的最终结果也记入交易日志（调用方自己记录时传 False）
+            
+        Returns:
+            与 _make_request 相同格式的结果；重试用尽时返回最后一次响应，
+            或抛出最后一次网络异常
+        """
+        retry = OrderRetry(self, order_data, lookup_first, log_outcome)
+        while retry.next_attempt():
+            if retry.delay:
+                time.sleep(retry.delay)
+            
+            if retry.needs_lookup:
+                try:
+                    found = self._lookup_order(order_data)
+                except Exception as e:
+                    retry.lookup_failed(e)
+                    continue
+                if retry.lookup_done(found) is not None:
+                    return found
+            
+            try:
+                result = self._make_request("POST", "/api/v3/trade/place-order", order_data)
+            except Exception as e:
+                retry.request_failed(e)
+                continue
+            if retry.response(result):
+                return result
+        
+        return retry.give_up()
+    
+    def _order_retry_delay(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间（指数退避 + 随机抖动）"""
+        delay = min(self.order_retry_max_delay, self.order_retry_backoff * (2 ** (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+    
+    def _lookup_order(self, order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        按 clientOid 查询订单（统一账户 V3）
+        
+        Returns:
+            订单存在时返回与下单成功相同格式的结果，不存在时返回 None；
+            查询本身失败时抛出异常
+        """
+        from urllib.parse import urlencode
+        
+        query = urlencode({"category": order_data.get('category', 'USDT-FUTURES'),
+                           "clientOid": order_data['clientOid']})
+        result = self._make_request("GET", "/api/v3/trade/order-info?" + query, None)
+        return self._parse_order_lookup(order_data, result)
+    
+    def _parse_order_lookup(self, order_data: Dict[str, Any], result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """解析按 clientOid 查询订单的响应"""
+        status_code = result['status_code']
+        response = result['response']
+        
+        if status_code in ORDER_RETRY_STATUS:
+            raise Exception(f"HTTP错误: {status_code}")
+        data = response.get('data') if status_code == 200 and response.get('code') == '00000' else None
+        if not data:
+            return None
+        
+        return {
+            "status_code": 200,
+            "response": {
+                "code": "00000",
+                "msg": "success",
+                "data": {"orderId": data.get('orderId'), "clientOid": order_data['clientOid']}
+            },
+            "recovered": True
+        }
+    
+    def _log_order_attempt(self, order_data: Dict[str, Any], attempt: int, outcome: str,
+                           error: Optional[str] = None):
+        """把下单重试过程中的一步记入交易日志"""
+        self._log_trades([self._order_attempt_record(order_data, attempt, outcome, error)])
+    
+    def _order_attempt_record(self, order_data: Dict[str, Any], attempt: int, outcome: str,
+                              error: Optional[str] = None) -> Dict[str, Any]:
+        """下单重试过程中一步的交易日志记录"""
+        symbol = order_data.get('symbol', '')
+        record = {
+            "coin": self._contracts_cache.get(symbol, {}).get('baseCoin') or symbol,
+            "action": order_data.get('side', ''),
+            "size": order_data.get('qty', ''),
+            "status": outcome,
+            "symbol": symbol,
+            "clientOid": order_data.get('clientOid'),
+            "attempt": attempt + 1
+        }
+        if error:
+            record["error"] = error
+        return record
+    
+    def _order_result(self, order_data: Dict[str, Any], status_code: int,
+                      response: Dict[str, Any], error: Optional[str] = None) -> Dict[str, Any]:
+        """构造单笔订单结果"""
+        result = {
+            "success": error is None and status_code == 200 and response.get('code') == '00000',
+            "symbol": order_data.get('symbol'),
+            "clientOid": order_data.get('clientOid'),
+            "status_code": status_code,
+            "response": response
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+    
+    def start_ticker_stream(self, coins: list, max_age: float = 5.0, url: Optional[str] = None,
+                            wait: Optional[float] = None) -> TickerStream:
+        """
+        启动 WebSocket 行情订阅，之后查询价格时优先使用内存中未过期的行情
+        
+        Args:
+            coins: 订阅的币种列表 (如 ['BTC', 'ETH'])
+            max_age: 行情超过多少秒未更新视为过期，过期后回退到 REST 查询
+            url: WebSocket 地址，默认 Bitget 公共行情地址
+            wait: 等待首次连接成功的秒数
+        """
+        symbols = [self._resolve_price_symbol(coin) for coin in coins]
+        if self.ticker_stream is not None:
+            self.ticker_stream.subscribe(symbols)
+            return self.ticker_stream
+        
+        self.ticker_stream = TickerStream(symbols, url=url or WS_PUBLIC_URL, max_age=max_age)
+        return self.ticker_stream.start(wait)
+    
+    def stop_ticker_stream(self):
+        """停止 WebSocket 行情订阅"""
+        if self.ticker_stream is not None:
+            self.ticker_stream.stop()
+            self.ticker_stream = None
+    
+    def _stream_price(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """WebSocket 行情表中未过期的价格信息"""
+        if self.ticker_stream is None:
+            return None
+        ticker = self.ticker_stream.get(symbol)
+        if ticker is None:
+            return None
+        price_info = self._ticker_to_price_info(symbol, ticker)
+        if not price_info["success"]:
+            return None  # 推送的数据无法解析，改用 REST 查询
+        return dict(price_info, source="websocket")
+    
+    def get_ticker_price(self, coin: str) -> Dict[str, Any]:
+        """
+        获取币种最新价格
+        
+        Args:
+            coin: 币种 (如 BTC, ETH 或 BTCUSDT)
+            
+        Returns:
+            包含价格信息的字典
+        """
+        symbol = self._resolve_price_symbol(coin)
+        streamed = self._stream_price(symbol)
+        if streamed is not None:
+            return streamed
+        cached = self.price_cache.lookup(symbol, refresh=self._refresh_ticker)
+        if cached is not None:
+            return cached
+        price_info = self.price_cache.fetch(symbol, self._fetch_ticker)
+        self._record_prices([price_info])
+        return price_info
+    
+    def _refresh_ticker(self, symbol: str) -> Dict[str, Any]:
+        """后台刷新价格缓存时使用：查询并记录行情历史"""
+        price_info = self._fetch_ticker(symbol)
+        self._record_prices([price_info])
+        return price_info
+    
+    def price_cache_stats(self) -> Dict[str, Any]:
+        """价格缓存的命中、请求次数和平均耗时统计"""
+        return self.price_cache.stats()
+    
+    def _fetch_ticker(self, symbol: str) -> Dict[str, Any]:
+        """通过单币种行情接口获取价格"""
+        # 优先尝试期货市场API（因为我们主要处理永续合约）
+        try:
+            response = self._http_get("/api/v2/mix/market/ticker",
+                                      params={"symbol": symbol, "productType": "USDT-FUTURES"})
+            data = response.json() if response.status_code == 200 else None
+            return self._parse_ticker_response(symbol, response.status_code, data)
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"网络请求失败: {str(e)}"
+            }
+    
+    def _parse_ticker_response(self, symbol: str, status_code: int,
+                               data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """解析单币种行情接口的响应"""
+        if status_code != 200:
+            return {
+                "success": False,
+                "error": f"HTTP错误: {status_code}"
+            }
+        
+        if data.get('code') != '00000':
+            return {
+                "success": False,
+                "error": data.get('msg', '期货API错误'),
+                "code": data.get('code', '')
+            }
+        
+        ticker_data = data.get('data', [])
+        if not ticker_data:
+            return {
+                "success": False,
+                "error": f"无行情数据: {symbol}"
+            }
+        
+        ticker = ticker_data[0] if isinstance(ticker_data, list) else ticker_data
+        return self._ticker_to_price_info(symbol, ticker)
+    
+    def fetch_ticker_snapshot(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        一次请求获取所有 USDT 永续合约行情，并按 symbol 建立索引
+        
+        Args:
+            force: 是否忽略快照有效期强制刷新
+            
+        Returns:
+            symbol -> 行情数据 的字典，获取失败时返回空字典
+        """
+        if not force and self._snapshot_is_fresh():
+            return self.ticker_snapshot
+        
+        try:
+            response = self._http_get("/api/v2/mix/market/tickers",
+                                      params={"productType": "USDT-FUTURES"})
+            data = response.json() if response.status_code == 200 else None
+            self._store_ticker_snapshot(response.status_code, data)
+            
+        except Exception as e:
+            print(f"⚠️ 获取全量行情失败，改用单币种查询: {str(e)}")
+            self.ticker_snapshot = {}
+            self.ticker_snapshot_at = 0.0
+        
+        return self.ticker_snapshot
+    
+    def _store_ticker_snapshot(self, status_code: int, data: Optional[Dict[str, Any]]):
+        """校验全量行情响应并按 symbol 建立索引"""
+        if status_code != 200:
+            raise Exception(f"HTTP错误: {status_code}")
+        
+        if data.get('code') != '00000':
+            raise Exception(f"API错误: {data.get('msg', '未知错误')}")
+        
+        self.ticker_snapshot = {
+            ticker['symbol']: ticker
+            for ticker in data.get('data') or []
+            if ticker.get('symbol')
+        }
+        self.ticker_snapshot_at = time.time()
+    
+    def _snapshot_is_fresh(self) -> bool:
+        """全量行情快照是否仍在有效期内"""
+        return bool(self.ticker_snapshot) and time.time() - self.ticker_snapshot_at < self.ticker_snapshot_ttl
+    
+    def get_multiple_prices(self, coins: list, use_snapshot: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取多个币种的最新价格
+        
+        依次使用：WebSocket 订阅中未过期的行情、价格缓存、全量行情快照
+        （剩余多个币种时），快照中没有的币种再单独并发查询。
+        
+        Args:
+            coins: 币种列表 (如 ['BTC', 'ETH', 'SOL'])
+            use_snapshot: 是否使用全量行情快照
+            
+        Returns:
+            包含所有币种价格信息的字典
+        """
+        symbols = {coin.upper(): self._resolve_price_symbol(coin) for coin in coins}
+        prices, pending = self._stream_prices(symbols)
+        prices, pending = self._cached_prices(pending, prices)
+        
+        snapshot = {}
+        if use_snapshot and len(pending) > 1:
+            snapshot = self.fetch_ticker_snapshot()
+        
+        fetched = {}
+        missing = {}
+        for coin, symbol in pending.items():
+            price_info = self._ticker_to_price_info(symbol, snapshot[symbol]) if symbol in snapshot else None
+            if price_info is not None and price_info["success"]:
+                fetched[coin] = price_info
+                self.price_cache.put(symbol, price_info)
+            else:
+                # 快照中没有或数据无法解析的币种单独查询
+                missing[coin] = symbol
+        
+        fetched.update(self._fetch_tickers_concurrently(missing))
+        self._record_prices(fetched.values())
+        prices.update(fetched)
+        
+        # 保持输入顺序
+        return {coin: prices[coin] for coin in symbols}
+    
+    def _cached_prices(self, symbols: Dict[str, str], prices: Dict[str, Dict[str, Any]]) -> tuple:
+        """
+        从价格缓存取价格（过期但仍可用的价格会触发后台刷新）
+        
+        Returns:
+            (合并了缓存命中的 币种 -> 价格信息, 仍需查询的 币种 -> 交易对)
+        """
+        pending = {}
+        for coin, symbol in symbols.items():
+            cached = self.price_cache.lookup(symbol, refresh=self._refresh_ticker)
+            if cached is not None:
+                prices[coin] = cached
+            else:
+                pending[coin] = symbol
+        return prices, pending
+    
+    def _stream_prices(self, symbols: Dict[str, str]) -> tuple:
+        """
+        从 WebSocket 行情表取价格
+        
+        Returns:
+            (币种 -> 价格信息, 仍需通过 REST 查询的 币种 -> 交易对)
+        """
+        if self.ticker_stream is None:
+            return {}, dict(symbols)
+        prices = {}
+        pending = {}
+        for coin, symbol in symbols.items():
+            streamed = self._stream_price(symbol)
+            if streamed is not None:
+                prices[coin] = streamed
+            else:
+                pending[coin] = symbol
+        return prices, pending
+    
+    def _record_prices(self, price_infos):
+        """使用 SQLite 存储时把查询到的价格写入行情历史（失败不影响查询结果）"""
+        if self.storage is None:
+            return
+        try:
+            self.storage.record_prices(list(price_infos))
+        except Exception as e:
+            print(f"⚠️ 记录行情历史失败: {str(e)}")
+    
+    def _fetch_tickers_concurrently(self, symbols: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        并发查询多个单币种行情，单个币种失败不影响其他币种
+        
+        Args:
+            symbols: 币种 -> 交易对 的字典
+            
+        Returns:
+            币种 -> 价格信息 的字典
+        """
+        if len(symbols) <= 1 or self.max_workers == 1:
+            return {coin: self.price_cache.fetch(symbol, self._fetch_ticker) for coin, symbol in symbols.items()}
+        
+        executor = self._get_executor()
+        futures = {coin: executor.submit(self.price_cache.fetch, symbol, self._fetch_ticker)
+                   for coin, symbol in symbols.items()}
+        
+        results = {}
+        for coin, future in futures.items():
+            try:
+                results[coin] = future.result()
+            except Exception as e:
+                results[coin] = {
+                    "success": False,
+                    "error": f"网络请求失败: {str(e)}"
+                }
+        return results
+
+
+class AsyncBitgetAPI:
+    """
+    Bitget 异步交易API类（基于 aiohttp）
+    
+    签名、符号解析、合约精度和请求体构造都复用内部的 BitgetAPI 实例，
+    这里只负责非阻塞的网络请求，可在一个事件循环中并发下单。
+    """
+    
+    def __init__(self, api_key: str, secret_key: str, passphrase: str,
+                 sandbox: bool = False, log_file: str = "trading_log.jsonl",
+                 timeout: float = 10, max_concurrency: int = 10,
+                 api: Optional[BitgetAPI] = None, **kwargs):
+        """
+        初始化异步API客户端
+        
+        Args:
+            api_key: API密钥
+            secret_key: API私钥
+            passphrase: API密码短语
+            sandbox: 是否使用测试环境
+            log_file: 交易日志文件路径
+            timeout: 默认请求超时（秒）
+            max_concurrency: 同时进行的最大请求数
+            api: 复用已有的 BitgetAPI 实例（共享合约缓存）
+            **kwargs: 传给 BitgetAPI 的其他参数
+        """
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise ImportError("AsyncBitgetAPI 需要 aiohttp，请先执行: pip install aiohttp")
+        
+        self.api = api or BitgetAPI(api_key, secret_key, passphrase, sandbox, log_file,
+                                    timeout=timeout, **kwargs)
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self._session = None
+        self._semaphore = None
+        self._contracts_fetched = False
+    
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """获取（必要时创建）共享的 aiohttp 会话"""
+        import asyncio
+        import aiohttp
+        
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+    
+    async def close(self):
+        """关闭HTTP会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+    
+    async def _http_get(self, path: str, params: Optional[Dict[str, Any]] = None) -> tuple:
+        """发送公共GET请求，返回 (status_code, json)"""
+        session = await self._get_session()
+        await self.api.rate_limiter.acquire_async(path)
+        async with self._semaphore:
+            async with session.get(self.api.base_url + path, params=params) as response:
+                self.api.rate_limiter.observe(path, response.status, response.headers)
+                data = await response.json(content_type=None) if response.status == 200 else None
+                return response.status, data
+    
+    async def _make_request(self, method: str, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """发送签名请求"""
+        session = await self._get_session()
+        await self.api.rate_limiter.acquire_async(endpoint)
+        headers, body = self.api._sign_request(method, endpoint, data)
+        async with self._semaphore:
+            async with session.request(method, self.api.base_url + endpoint,
+                                       headers=headers, data=body) as response:
+                self.api.rate_limiter.observe(endpoint, response.status, response.headers)
+                text = await response.text()
+                return {
+                    "status_code": response.status,
+                    "response": json.loads(text) if text else {}
+                }
+    
+    async def _submit_order(self, order_data: Dict[str, Any], lookup_first: bool = False) -> Dict[str, Any]:
+        """
+        提交单笔订单，失败时按 clientOid 幂等重试（重试策略与 BitgetAPI._submit_order 共用 OrderRetry）
+        
+        重试记录先暂存，再在线程池中写入交易日志（文件锁、fsync 或 SQLite 事务不在事件循环中执行）
+        """
+        import asyncio
+        
+        pending = []
+        retry = OrderRetry(self.api, order_data, lookup_first,
+                           log=lambda attempt, outcome, error=None: pending.append((attempt, outcome, error)))
+        try:
+            while retry.next_attempt():
+                await self._write_order_attempts(order_data, pending)
+                if retry.delay:
+                    await asyncio.sleep(retry.delay)
+                
+                if retry.needs_lookup:
+                    try:
+                        found = await self._lookup_order(order_data)
+                    except Exception as e:
+                        retry.lookup_failed(e)
+                        continue
+                    if retry.lookup_done(found) is not None:
+                        return found
+                
+                try:
+                    result = await self._make_request("POST", "/api/v3/trade/place-order", order_data)
+                except Exception as e:
+                    retry.request_failed(e)
+                    continue
+                if retry.response(result):
+                    return result
+            
+            return retry.give_up()
+        finally:
+            await self._write_order_attempts(order_data, pending)
+    
+    async def _write_order_attempts(self, order_data: Dict[str, Any], pending: list):
+        """在线程池中把暂存的下单重试记录写入交易日志"""
+        if not pending:
+            return
+        import asyncio
+        
+        records = [self.api._order_attempt_record(order_data, *step) for step in pending]
+        pending.clear()
+        await asyncio.get_running_loop().run_in_executor(None, self.api._log_trades, records)
+    
+    async def _lookup_order(self, order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按 clientOid 查询订单（返回值同 BitgetAPI._lookup_order）"""
+        from urllib.parse import urlencode
+        
+        query = urlencode({"category": order_data.get('category', 'USDT-FUTURES'),
+                           "clientOid": order_data['clientOid']})
+        result = await self._make_request("GET", "/api/v3/trade/order-info?" + query, None)
+        return self.api._parse_order_lookup(order_data, result)
+    
+    async def _refresh_contracts_cache(self):
+        """刷新合约信息缓存"""
+        try:
+            status_code, data = await self._http_get("/api/v2/mix/market/contracts",
+                                                     params={"productType": "USDT-FUTURES"})
+            self.api._store_contracts(status_code, data)
+        except Exception as e:
+            print(f"❌ 刷新合约缓存失败: {str(e)}")
+            self.api.contracts_loaded = False
+    
+    async def _ensure_contracts(self):
+        """确保合约缓存可用：优先读文件，文件不可用时异步从API获取（每个实例一次）"""
+        self.api._ensure_contracts_loaded(allow_network=False)
+        if not self.api.contracts_loaded and not self._contracts_fetched:
+            self._contracts_fetched = True
+            await self._refresh_contracts_cache()
+    
+    async def search_contracts(self, query: str, limit: int = 20) -> list:
+        """搜索合约交易对"""
+        self.api._ensure_contracts_loaded(allow_network=False)
+        if not self.api.contracts_loaded:
+            await self._refresh_contracts_cache()
+        return self.api._search_loaded_contracts(query, limit)
+    
+    async def _set_leverage(self, symbol: str, margin_mode: str, leverage: str) -> Dict[str, Any]:
+        """设置杠杆倍数（统一账户 V3）"""
+        leverage_data = self.api._build_leverage_request(symbol, margin_mode, leverage)
+        return await self._make_request("POST", "/api/v3/account/set-leverage", leverage_data)
+    
+    async def place_market_order(self, coin: str, side: str, size: str,
+                                 margin_mode: str = "crossed", leverage: str = "1") -> Dict[str, Any]:
+        """下市价单（统一账户 V3）"""
+        await self._ensure_contracts()
+        order_data = self.api._build_market_order(coin, side, size, margin_mode)
+        
+        if leverage != "1":
+            print(f"🔄 设置 {order_data['symbol']} 杠杆为 {leverage}x...")
+            await self._set_leverage(order_data["symbol"], margin_mode, leverage)
+        
+        return await self._submit_order(order_data)
+    
+    async def place_limit_order(self, coin: str, side: str, size: str, price: str,
+                                margin_mode: str = "crossed",
+                                force: str = "gtc") -> Dict[str, Any]:
+        """下限价单（统一账户 V3）"""
+        await self._ensure_contracts()
+        order_data = self.api._build_limit_order(coin, side, size, price, margin_mode, force)
+        return await self._submit_order(order_data)
+    
+    async def close_position(self, coin: str, side: str, size: str,
+                             order_type: str = "market", price: Optional[str] = None,
+                             margin_mode: str = "crossed") -> Dict[str, Any]:
+        """平仓（统一账户 V3，reduceOnly=yes）"""
+        await self._ensure_contracts()
+        order_data = self.api._build_close_order(coin, side, size, order_type, price, margin_mode)
+        return await self._submit_order(order_data)
+    
+    async def _fetch_ticker(self, symbol: str) -> Dict[str, Any]:
+        """通过单币种行情接口获取价格"""
+        try:
+            status_code, data = await self._http_get(
+                "/api/v2/mix/market/ticker",
+                params={"symbol": symbol, "productType": "USDT-FUTURES"}
+            )
+            return self.api._parse_ticker_response(symbol, status_code, data)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"网络请求失败: {str(e)}"
+            }
+    
+    def _use_cached(self, prices: Dict[str, Dict[str, Any]], coin: str, symbol: str) -> bool:
+        """价格缓存中有未过期价格时写入 prices（异步版本不使用过期价格）"""
+        cached = self.api.price_cache.lookup(symbol)
+        if cached is None:
+            return False
+        prices[coin] = cached
+        return True
+    
+    async def get_ticker_price(self, coin: str) -> Dict[str, Any]:
+        """获取币种最新价格"""
+        await self._ensure_contracts()
+        symbol = self.api._resolve_price_symbol(coin)
+        streamed = self.api._stream_price(symbol)
+        if streamed is not None:
+            return streamed
+        cached = self.api.price_cache.lookup(symbol)
+        if cached is not None:
+            return cached
+        price_info = await self._fetch_ticker(symbol)
+        self.api.price_cache.put(symbol, price_info)
+        self.api._record_prices([price_info])
+        return price_info
+    
+    async def fetch_ticker_snapshot(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """一次请求获取所有 USDT 永续合约行情（与 BitgetAPI 共享快照）"""
+        if not force and self.api._snapshot_is_fresh():
+            return self.api.ticker_snapshot
+        
+        try:
+            status_code, data = await self._http_get("/api/v2/mix/market/tickers",
+                                                     params={"productType": "USDT-FUTURES"})
+            self.api._store_ticker_snapshot(status_code, data)
+        except Exception as e:
+            print(f"⚠️ 获取全量行情失败，改用单币种查询: {str(e)}")
+            self.api.ticker_snapshot = {}
+            self.api.ticker_snapshot_at = 0.0
+        
+        return self.api.ticker_snapshot
+    
+    async def get_multiple_prices(self, coins: list, use_snapshot: bool = True) -> Dict[str, Dict[str, Any]]:
+        """批量获取多个币种的最新价格，快照中没有的币种并发查询"""
+        await self._ensure_contracts()
+        symbols = {coin.upper(): self.api._resolve_price_symbol(coin) for coin in coins}
+        prices, pending = self.api._stream_prices(symbols)
+        pending = {coin: symbol for coin, symbol in pending.items()
+                   if not self._use_cached(prices, coin, symbol)}
+        
+        snapshot = {}
+        if use_snapshot and len(pending) > 1:
+            snapshot = await self.fetch_ticker_snapshot()
+        
+        fetched = {}
+        missing = {}
+        for coin, symbol in pending.items():
+            price_info = self.api._ticker_to_price_info(symbol, snapshot[symbol]) if symbol in snapshot else None
+            if price_info is not None and price_info["success"]:
+                fetched[coin] = price_info
+            else:
+                missing[coin] = symbol
+        
+        import asyncio
+        
+        results = await asyncio.gather(*(self._fetch_ticker(symbol) for symbol in missing.values()))
+        fetched.update(zip(missing.keys(), results))
+        for coin, price_info in fetched.items():
+            self.api.price_cache.put(symbols[coin], price_info)
+        self.api._record_prices(fetched.values())
+        prices.update(fetched)
+        
+        return {coin: prices[coin] for coin in symbols}
+
+
+def create_api_from_args(args) -> "BitgetAPI":
+    """根据命令行参数创建API客户端"""
+    return BitgetAPI(args.api_key, args.secret_key, args.passphrase, args.sandbox,
+                     pool_size=args.pool_size, timeout=args.timeout,
+                     max_retries=args.max_retries, max_workers=args.max_workers,
+                     journal_fsync=args.journal_fsync, storage_db=args.db,
+                     order_retries=args.order_retries, price_cache_ttl=args.price_cache_ttl)
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description="Bitget 交易API命令行工具")
+    parser.add_argument("--api-key", required=True, help="API密钥")
+    parser.add_argument("--secret-key", required=True, help="API私钥")
+    parser.add_argument("--passphrase", required=True, help="API密码短语")
+    parser.add_argument("--sandbox", action="store_true", help="使用测试环境")
+    parser.add_argument("--timeout", type=float, default=10, help="HTTP请求超时（秒）")
+    parser.add_argument("--pool-size", type=int, default=10, help="HTTP连接池大小")
+    parser.add_argument("--max-retries", type=int, default=3, help="429/5xx 最大重试次数")
+    parser.add_argument("--max-workers", type=int, default=8, help="并发查询行情的最大线程数")
+    parser.add_argument("--journal-fsync", default="interval", choices=list(TradeJournal.FSYNC_POLICIES),
+                        help="交易日志刷盘策略")
+    parser.add_argument("--order-retries", type=int, default=3,
+                        help="下单网络失败或 429/5xx 时的最大重试次数（按 clientOid 幂等）")
+    parser.add_argument("--price-cache-ttl", type=float, default=2.0,
+                        help="单币种价格缓存有效期（秒），0 表示不缓存")
+    parser.add_argument("--db", help="SQLite 数据库路径（保存交易日志、合约、投资组合快照和行情历史）")
+    
+    subparsers = parser.add_subparsers(dest="command", help="操作命令")
+    
+    # 市价单命令
+    market_parser = subparsers.add_parser("market", help="下市价单")
+    market_parser.add_argument("coin", help="币种 (如 BTC, ETH)")
+    market_parser.add_argument("side", choices=["buy", "sell"], help="方向")
+    market_parser.add_argument("size", help="数量")
+    market_parser.add_argument("--margin-mode", default="crossed", 
+                              choices=["crossed", "isolated"], help="保证金模式")
+    
+    # 限价单命令
+    limit_parser = subparsers.add_parser("limit", help="下限价单")
+    limit_parser.add_argument("coin", help="币种 (如 BTC, ETH)")
+    limit_parser.add_argument("side", choices=["buy", "sell"], help="方向")
+    limit_parser.add_argument("size", help="数量")
+    limit_parser.add_argument("price", help="价格")
+    limit_parser.add_argument("--margin-mode", default="crossed",
+                             choices=["crossed", "isolated"], help="保证金模式")
+    limit_parser.add_argument("--force", default="gtc",
+                             choices=["gtc", "ioc", "fok", "post_only"], help="订单有效期")
+    
+    # 平仓命令
+    close_parser = subparsers.add_parser("close", help="平仓")
+    close_parser.add_argument("coin", help="币种")
+    close_parser.add_argument("side", choices=["buy", "sell"], help="平仓方向")
+    close_parser.add_argument("size", help="平仓数量")
+    close_parser.add_argument("--type", default="market", 
+                             choices=["market", "limit"], help="订单类型")
+    close_parser.add_argument("--price", help="限价单价格")
+    
+    # 价格查询命令
+    price_parser = subparsers.add_parser("price", help="查询币种价格")
+    price_parser.add_argument("coins", nargs="+", help="币种列表 (如 BTC ETH SOL)")
+    price_parser.add_argument("--no-snapshot", action="store_true",
+                             help="不使用全量行情快照，逐个查询")
+    
+    # 更新投资组合命令
+    portfolio_parser = subparsers.add_parser("portfolio", help="更新投资组合分析")
+    portfolio_parser.add_argument("--file", nargs="+", default=["portfolio_analysis.json"],
+                                 help="投资组合文件路径，可以是多个文件或通配符（如 'accounts/*.json'）")
+    portfolio_parser.add_argument("--workers", type=int, default=None,
+                                 help="多个文件时并行处理的进程数（默认CPU核数，1 表示不启用子进程）")
+    
+    # 自动交易命令
+    auto_trade_parser = subparsers.add_parser("auto-trade", help="基于资产变化自动交易")
+    auto_trade_parser.add_argument("--assets-file", default="assets.json", 
+                                  help="资产文件路径")
+    auto_trade_parser.add_argument("--watch", action="store_true",
+                                  help="常驻运行，资产文件每次保存后立即分析并下单")
+    auto_trade_parser.add_argument("--debounce", type=float, default=0.2,
+                                  help="--watch 模式下最后一次写入后等待多少秒再分析")
+    auto_trade_parser.add_argument("--poll-interval", type=float, default=1.0,
+                                  help="无法使用 inotify 时轮询文件的间隔（秒）")
+    
+    # 交易日志命令
+    log_parser = subparsers.add_parser("log", help="交易日志管理")
+    log_parser.add_argument("--limit", type=int, default=50, 
+                           help="显示最近的记录数量")
+    log_parser.add_argument("--clear", action="store_true", 
+                           help="清空交易日志")
+    log_parser.add_argument("--coin", help="按币种过滤")
+    log_parser.add_argument("--status", choices=["success", "failed", "retry", "recovered"], help="按状态过滤")
+    log_parser.add_argument("--action", choices=["buy", "sell"], help="按方向过滤")
+    log_parser.add_argument("--since", help="起始时间 (如 2024-01-01 或 2024-01-01T08:00:00)")
+    log_parser.add_argument("--until", help="结束时间（不包含）")
+    log_parser.add_argument("--cursor", help="分页游标（上一页输出的下一页游标）")
+    log_parser.add_argument("--compact", action="store_true",
+                           help="合并交易日志分段")
+    log_parser.add_argument("--keep", type=int,
+                           help="合并时只保留最近的记录数量")
+    
+    # 合约搜索命令
+    search_parser = subparsers.add_parser("search", help="搜索合约交易对")
+    search_parser.add_argument("query", help="搜索关键字 (如 BTC, ETH, TSLA)")
+    search_parser.add_argument("--limit", type=int, default=10, 
+                              help="返回结果数量限制")
+    
+    # 合约信息命令
+    info_parser = subparsers.add_parser("info", help="查看合约详细信息")
+    info_parser.add_argument("symbol", help="合约符号 (如 BTCUSDT_UMCBL)")
+    
+    # 刷新缓存命令
+    refresh_parser = subparsers.add_parser("refresh-cache", help="刷新合约信息缓存")
+    
+    # 常驻服务命令
+    serve_parser = subparsers.add_parser("serve", help="常驻进程，按行接收JSON命令")
+    serve_parser.add_argument("--socket", dest="socket_path",
+                             help="Unix socket 路径（不指定则使用 stdin/stdout）")
+    serve_parser.add_argument("--stream", nargs="+", metavar="COIN",
+                             help="通过 WebSocket 订阅这些币种的行情，价格查询优先使用内存行情")
+    serve_parser.add_argument("--stream-max-age", type=float, default=5.0,
+                             help="WebSocket 行情超过多少秒未更新时改用 REST 查询")
+    serve_parser.add_argument("--contract-refresh", type=float, default=300,
+                             help="后台增量刷新合约信息的间隔（秒），0 表示不刷新")
+    
+    args = parser.parse_args()
+    
+    if not args.command:
+        parser.print_help()
+        return
+    
+    # 创建API客户端（stdin 服务模式下 stdout 只保留给响应行）
+    if args.command == "serve" and not args.socket_path:
+        with contextlib.redirect_stdout(sys.stderr):
+            api = create_api_from_args(args)
+    else:
+        api = create_api_from_args(args)
+    
+    try:
+        if args.command == "market":
+            result = api.place_market_order(args.coin, args.side, args.size, args.margin_mode)
+            handle_order_result(result)
+            
+        elif args.command == "limit":
+            result = api.place_limit_order(args.coin, args.side, args.size, args.price,
+                                         args.margin_mode, args.force)
+            handle_order_result(result)
+            
+        elif args.command == "close":
+            result = api.close_position(args.coin, args.side, args.size, args.type, args.price)
+            handle_order_result(result)
+            
+        elif args.command == "price":
+            handle_price_query(api, args.coins, not args.no_snapshot)
+            
+        elif args.command == "portfolio":
+            handle_portfolio_update(api, args.file, args.workers)
+            
+        elif args.command == "auto-trade":
+            handle_auto_trade(api, args.assets_file, args.watch, args.debounce, args.poll_interval)
+            
+        elif args.command == "log":
+            handle_trading_log(api, args.limit, args.clear, args.compact, args.keep,
+                               filters={"coin": args.coin, "status": args.status, "action": args.action,
+                                        "since": args.since, "until": args.until, "cursor": args.cursor})
+            
+        elif args.command == "search":
+            handle_contract_search(api, args.query, args.limit)
+            
+        elif args.command == "info":
+            handle_contract_info(api, args.symbol)
+            
+        elif args.command == "refresh-cache":
+            handle_refresh_cache(api)
+            
+        elif args.command == "serve":
+            if args.contract_refresh > 0:
+                api.start_contract_refresher(args.contract_refresh)
+            if args.stream:
+                with contextlib.redirect_stdout(sys.stderr):
+                    api.start_ticker_stream(args.stream, max_age=args.stream_max_age)
+            handle_serve(api, args.socket_path)
+        
+    except Exception as e:
+        print(f"❌ 发生错误: {str(e)}")
+
+
+def handle_order_result(result):
+    """处理订单结果"""
+    print(f"状态码: {result['status_code']}")
+    response = result['response']
+    
+    if result['status_code'] == 200 and response.get('code') == '00000':
+        print("✅ 订单提交成功!")
+        data = response.get('data', {})
+        if 'orderId' in data:
+            print(f"订单ID: {data['orderId']}")
+        if 'clientOid' in data:
+            print(f"客户端ID: {data['clientOid']}")
+    else:
+        print("❌ 订单失败!")
+        print(f"错误信息: {response.get('msg', '未知错误')}")
+        if 'code' in response:
+            print(f"错误代码: {response['code']}")
+    
+    print(f"完整响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
+
+
+def handle_price_query(api, coins, use_snapshot=True):
+    """处理价格查询"""
+    print("📊 正在查询最新价格...")
+    
+    prices = api.get_multiple_prices(coins, use_snapshot)
+    
+    print("\n=== 最新价格信息 ===")
+    for coin, info in prices.items():
+        if info.get('success'):
+            price = info['price']
+            change_24h = info['price_change_percent_24h']
+            change_symbol = "📈" if change_24h >= 0 else "📉"
+            
+            print(f"{coin:>6}: ${price:>10,.2f} {change_symbol} {change_24h:>6.2f}%")
+        else:
+            print(f"{coin:>6}: ❌ {info.get('error', '获取失败')}")
+
+
+def _expand_portfolio_paths(patterns: list) -> list:
+    """展开文件路径中的通配符（保持顺序、去重），没有匹配的普通路径原样保留"""
+    import glob
+    
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _read_portfolio_coins(file_path: str) -> Dict[str, Any]:
+    """读取投资组合文件中的币种列表（子进程中执行）"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            portfolio = json.load(f)
+        return {"file": file_path, "coins": list(portfolio['portfolio_analysis']['holdings'])}
+    except FileNotFoundError:
+        return {"file": file_path, "error": f"❌ 文件不存在: {file_path}"}
+    except json.JSONDecodeError:
+        return {"file": file_path, "error": f"❌ JSON文件格式错误: {file_path}"}
+    except Exception as e:
+        return {"file": file_path, "error": f"❌ 更新失败: {str(e)}"}
+
+
+def _finite_or_none(value: float, digits: Optional[int] = None) -> Optional[float]:
+    """非有限数（NaN/inf，如总市值为0时的占比）转为 None，写入 JSON 时为 null"""
+    if not math.isfinite(value):
+        return None
+    return round(value, digits) if digits is not None else value
+
+
+def _update_portfolio_file(file_path: str, prices: Dict[str, Optional[float]],
+                           keep_document: bool = False) -> Dict[str, Any]:
+    """
+    用给定价格重新估值一个投资组合文件并原子写回（子进程中执行）
+    
+    Args:
+        file_path: 投资组合文件路径
+        prices: 币种 -> 价格，获取失败为 None
+        keep_document: 是否在结果中返回更新后的内容（保存数据库快照用）
+        
+    Returns:
+        {"file", "lines": 要输出的信息, "total_value", "document"} 或 {"file", "error"}
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            portfolio = json.load(f)
+        
+        analysis = portfolio['portfolio_analysis']
+        holdings = analysis['holdings']
+        coins = list(holdings.keys())
+        price_list = [1.0 if coin == "USDT" else prices.get(coin) for coin in coins]
+        
+        # 目标权重（0~1，可选）：计算偏离和再平衡数量
+        target_weights = analysis.get('target_weights')
+        valuation = value_portfolio(
+            [holdings[coin]['quantity'] for coin in coins], price_list,
+            [target_weights.get(coin, 0) for coin in coins] if target_weights else None
+        )
+        total_value = float(valuation['totals'][0]) if coins else 0.0
+        
+        columns = {name: valuation[name].tolist() for name in
+                   ("priced", "market_values", "weights", "target_weights", "drift",
+                    "rebalance_values", "rebalance_quantities") if valuation[name] is not None}
+        
+        lines = []
+        updated_holdings = {}
+        for i, coin in enumerate(coins):
+            quantity = holdings[coin]['quantity']
+            if not columns['priced'][i]:
+                # 价格缺失的持仓保留原有数据，不计入总市值
+                updated_holdings[coin] = {**holdings[coin], "price_missing": True}
+                updated_holdings[coin].pop('percentage_of_portfolio', None)
+                lines.append(f"❌ {coin}: 获取价格失败，不计入本次估值")
+                continue
+            
+            price = price_list[i]
+            market_value = columns['market_values'][i]
+            entry = {
+                "quantity": quantity,
+                "current_price_usd": price,
+                "market_value_usd": round(market_value, 2),
+                # 组合总市值为0时占比无意义，记为 null
+                "percentage_of_portfolio": _finite_or_none(columns['weights'][i] * 100, 2)
+            }
+            if 'drift' in columns and not math.isnan(columns['target_weights'][i]):
+                entry.update({
+                    "target_percentage": _finite_or_none(columns['target_weights'][i] * 100, 2),
+                    "drift_percentage": _finite_or_none(columns['drift'][i] * 100, 2),
+                    "rebalance_usd": _finite_or_none(columns['rebalance_values'][i], 2),
+                    "rebalance_quantity": _finite_or_none(columns['rebalance_quantities'][i])
+                })
+            updated_holdings[coin] = entry
+            
+            lines.append(f"✅ {coin}: ${price:,.2f} (持仓: {quantity} 价值: ${market_value:,.2f})")
+        
+        # 更新JSON文件
+        analysis['current_market_prices'] = {
+            coin: price_list[i] for i, coin in enumerate(coins) if columns['priced'][i]
+        }
+        analysis['holdings'] = updated_holdings
+        analysis['total_value_usd'] = round(total_value, 2)
+        analysis['analysis_date'] = time.strftime('%Y-%m-%d')
+        
+        # 先写临时文件再原子替换，中途失败不会留下写了一半的文件
+        tmp_path = f"{file_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # allow_nan=False：NaN 不是合法 JSON，server.js 无法解析
+            json.dump(portfolio, f, indent=2, ensure_ascii=False, allow_nan=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        
+        lines.append(f"\n✅ 投资组合已更新!")
+        lines.append(f"📊 总资产价值: ${total_value:,.2f}")
+        lines.append(f"📝 文件已保存到: {file_path}")
+        
+        # 显示资产分配
+        lines.append("\n=== 最新资产分配 ===")
+        sorted_holdings = sorted(
+            ((coin, info) for coin, info in updated_holdings.items() if not info.get('price_missing')),
+            key=lambda x: x[1]['market_value_usd'], reverse=True)
+        
+        def percent(value, spec):
+            return "-" if value is None else format(value, spec) + "%"
+        
+        for coin, info in sorted_holdings:
+            line = f"{coin:>6}: ${info['market_value_usd']:>10,.2f} ({percent(info['percentage_of_portfolio'], '>5.2f')})"
+            if 'drift_percentage' in info:
+                rebalance = "-" if info['rebalance_usd'] is None else f"${info['rebalance_usd']:>+10,.2f}"
+                line += (f"  目标 {percent(info['target_percentage'], '>5.2f')}"
+                         f"  偏离 {percent(info['drift_percentage'], '>+6.2f')}  调整 {rebalance}")
+            lines.append(line)
+        
+        return {"file": file_path, "lines": lines, "total_value": total_value,
+                "document": portfolio if keep_document else None}
+        
+    except FileNotFoundError:
+        return {"file": file_path, "error": f"❌ 文件不存在: {file_path}"}
+    except json.JSONDecodeError:
+        return {"file": file_path, "error": f"❌ JSON文件格式错误: {file_path}"}
+    except Exception as e:
+        return {"file": file_path, "error": f"❌ 更新失败: {str(e)}"}
+
+
+def handle_portfolio_update(api, file_paths, workers: Optional[int] = None):
+    """
+    处理投资组合更新
+    
+    可以一次更新多个文件（支持通配符）：先汇总所有文件的币种，每个币种只查询一次价格，
+    再由多个子进程并行估值并原子写回各自的文件。
+    
+    Args:
+        api: BitgetAPI 实例
+        file_paths: 文件路径或路径列表
+        workers: 子进程数（默认CPU核数，1 或只有一个文件时在当前进程处理）
+    """
+    print("🔄 正在更新投资组合分析...")
+    
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    paths = _expand_portfolio_paths(file_paths)
+    if not paths:
+        print("❌ 没有匹配的投资组合文件")
+        return
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    pool = None
+    if workers > 1:
+        # 多进程模块导入较慢，只在需要并行时导入
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+    run = pool.map if pool is not None else map
+    
+    try:
+        # 汇总所有文件的币种
+        readable = []
+        coins = []
+        for result in run(_read_portfolio_coins, paths):
+            if 'error' in result:
+                print(result['error'])
+                continue
+            readable.append(result['file'])
+            coins.extend(coin for coin in result['coins'] if coin not in coins)
+        if not readable:
+            return
+        
+        # 获取最新价格（USDT 固定为1，不需要查询；多个币种走全量行情快照），每个币种只查询一次
+        print(f"正在获取 {', '.join(coins)} 的最新价格...")
+        price_infos = api.get_multiple_prices([coin for coin in coins if coin != "USDT"])
+        prices = {
+            coin: info['price'] if info.get('success') else None
+            for coin, info in price_infos.items()
+        }
+        
+        keep_document = api.storage is not None
+        updated = 0
+        total_value = 0.0
+        for result in run(_update_portfolio_file, readable, [prices] * len(readable),
+                          [keep_document] * len(readable)):
+            if len(paths) > 1:
+                print(f"\n===== {result['file']} =====")
+            if 'error' in result:
+                print(result['error'])
+                continue
+            for line in result['lines']:
+                print(line)
+            if keep_document:
+                api.storage.save_snapshot(result['file'], result['document'])
+            updated += 1
+            total_value += result['total_value']
+        
+        if len(paths) > 1:
+            print(f"\n✅ 已更新 {updated}/{len(paths)} 个投资组合文件，合计 ${total_value:,.2f}")
+        
+    except Exception as e:
+        print(f"❌ 更新失败: {str(e)}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def handle_auto_trade(api, assets_file, watch=False, debounce=0.2, poll_interval=1.0):
+    """处理自动交易"""
+    print("🤖 启动自动交易系统...")
+    print(f"📁 监控资产文件: {assets_file}")
+    
+    try:
+        if watch:
+            api.watch_portfolio(assets_file, debounce=debounce, poll_interval=poll_interval)
+            api.close()
+            return
+        
+        api.auto_trade_based_on_portfolio_change(assets_file)
+        print("✅ 自动交易完成")
+        
+    except Exception as e:
+        print(f"❌ 自动交易失败: {str(e)}")
+
+
+def handle_trading_log(api, limit, clear, compact=False, keep=None, filters=None):
+    """处理交易日志"""
+    if clear:
+        api.clear_trading_log()
+        return
+    
+    if compact:
+        api.compact_trading_log(keep)
+        return
+    
+    print("📊 交易日志:")
+    log_data = api.get_trading_log(limit, **(filters or {}))
+    
+    if 'error' in log_data:
+        print(f"❌ {log_data['error']}")
+        return
+    
+    print(f"📈 总交易记录: {log_data['total_records']}")
+    print(f"🕒 最后更新: {log_data['last_updated']}")
+    
+    if log_data['recent_records']:
+        print(f"\n=== 最近 {len(log_data['recent_records'])} 条记录 ===")
+        for record in reversed(log_data['recent_records']):
+            status_emoji = {"success": "✅", "recovered": "✅", "retry": "🔁"}.get(record['status'], "❌")
+            print(f"{status_emoji} {record['timestamp']} | {record['action'].upper()} {record['size']} {record['coin']} | {record['status']}")
+        if log_data.get('next_cursor'):
+            print(f"\n➡️ 下一页: --cursor {log_data['next_cursor']}")
+    else:
+        print("📝 暂无交易记录")
+
+
+def handle_contract_search(api, query, limit):
+    """处理合约搜索"""
+    print(f"🔍 搜索合约: {query}")
+    
+    try:
+        results = api.search_contracts(query, limit)
+        
+        if not results:
+            print("❌ 未找到匹配的合约")
+            return
+        
+        print(f"\n=== 找到 {len(results)} 个匹配的合约 ===")
+        for i, contract in enumerate(results, 1):
+            symbol = contract['symbol']
+            display_name = contract['displayName']
+            min_trade = contract['minTradeNum']
+            max_lever = contract['maxLever']
+            
+            print(f"{i:>2}. {display_name}")
+            print(f"     交易对: {symbol}")
+            print(f"     最小数量: {min_trade} | 最大杠杆: {max_lever}x")
+            print()
+            
+    except Exception as e:
+        print(f"❌ 搜索失败: {str(e)}")
+
+
+def handle_contract_info(api, symbol):
+    """处理合约信息查询"""
+    print(f"📊 查询合约信息: {symbol}")
+    
+    try:
+        info = api.get_contract_info(symbol)
+        
+        if not info:
+            print(f"❌ 未找到合约: {symbol}")
+            return
+        
+        print(f"\n=== {symbol} 合约详情 ===")
+        print(f"基础币种: {info.get('baseCoin', 'N/A')}")
+        print(f"计价币种: {info.get('quoteCoin', 'N/A')}")
+        print(f"最小交易数量: {info.get('minTradeNum', 'N/A')}")
+        print(f"数量精度: {info.get('volumePlace', 'N/A')} 位小数")
+        print(f"价格精度: {info.get('pricePlace', 'N/A')} 位小数")
+        print(f"最小杠杆: {info.get('minLever', 'N/A')}x")
+        print(f"最大杠杆: {info.get('maxLever', 'N/A')}x")
+        print(f"最小交易金额(USDT): {info.get('minTradeUSDT', 'N/A')}")
+        print(f"最大交易金额(USDT): {info.get('maxTradeUSDT', 'N/A')}")
+        print(f"支持保证金币种: {', '.join(info.get('supportMarginCoins', []))}")
+        
+        if info.get('launchTime'):
+            print(f"上线时间: {info.get('launchTime', 'N/A')}")
+        if info.get('fundingTime'):
+            print(f"资金费用时间: {info.get('fundingTime', 'N/A')}")
+            
+    except Exception as e:
+        print(f"❌ 查询失败: {str(e)}")
+
+
+def handle_refresh_cache(api):
+    """处理缓存刷新"""
+    print("🔄 刷新合约信息缓存...")
+    
+    try:
+        diff = api.refresh_contracts()
+        if diff is None:
+            return
+        for label, symbols in (("🆕 新上线", diff['added']), ("🗑️ 已下线", diff['removed'])):
+            if symbols and len(symbols) <= 20:
+                print(f"{label}: {', '.join(symbols)}")
+        for symbol, fields in list(diff['changed'].items())[:20]:
+            changes = ", ".join(f"{field}: {old} → {new}" for field, (old, new) in fields.items())
+            print(f"✏️ {symbol}: {changes}")
+        print("✅ 缓存刷新完成")
+        
+    except Exception as e:
+        print(f"❌ 刷新失败: {str(e)}")
+
+
+# 常驻服务支持的命令
+SERVE_COMMANDS = ("market", "limit", "close", "batch", "price", "search", "ping")
+
+
+def is_order_success(result: Dict[str, Any]) -> bool:
+    """判断下单结果是否成功"""
+    response = result.get('response') or {}
+    return result.get('status_code') == 200 and response.get('code') == '00000'
+
+
+def dispatch_serve_command(api, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    执行一条常驻服务命令
+    
+    Args:
+        api: BitgetAPI 实例
+        request: 命令字典，如 {"id": 1, "cmd": "market", "coin": "BTC", "side": "buy", "size": "0.001"}
+        
+    Returns:
+        响应字典，包含 id、ok、success、result 以及命令执行期间的输出
+    """
+    request_id = request.get('id')
+    cmd = request.get('cmd')
+    output = io.StringIO()
+    
+    try:
+        if cmd not in SERVE_COMMANDS:
+            raise ValueError(f"不支持的命令: {cmd}")
+        
+        with contextlib.redirect_stdout(output):
+            if cmd == "market":
+                result = api.place_market_order(request['coin'], request['side'], str(request['size']),
+                                                request.get('margin_mode', 'crossed'),
+                                                str(request.get('leverage', '1')))
+                handle_order_result(result)
+                success = is_order_success(result)
+            elif cmd == "limit":
+                result = api.place_limit_order(request['coin'], request['side'], str(request['size']),
+                                               str(request['price']),
+                                               request.get('margin_mode', 'crossed'),
+                                               request.get('force', 'gtc'))
+                handle_order_result(result)
+                success = is_order_success(result)
+            elif cmd == "close":
+                result = api.close_position(request['coin'], request['side'], str(request['size']),
+                                            request.get('type', 'market'), request.get('price'),
+                                            request.get('margin_mode', 'crossed'))
+                handle_order_result(result)
+                success = is_order_success(result)
+            elif cmd == "batch":
+                result = api.place_orders_batch(request.get('orders', []))
+                success = all(item['success'] for item in result)
+            elif cmd == "price":
+                result = api.get_multiple_prices(request.get('coins', []))
+                success = all(info.get('success') for info in result.values())
+            elif cmd == "search":
+                result = api.search_contracts(request.get('query', ''), int(request.get('limit', 10)))
+                success = True
+            else:  # ping
+                result = {"pid": os.getpid(), "rate_limits": api.rate_limiter.stats(),
+                          "stream": api.ticker_stream.stats_snapshot() if api.ticker_stream else None,
+                          "price_cache": api.price_cache_stats()}
+                success = True
+        
+        return {
+            "id": request_id,
+            "ok": True,
+            "success": success,
+            "result": result,
+            "output": output.getvalue()
+        }
+        
+    except Exception as e:
+        return {
+            "id": request_id,
+            "ok": False,
+            "success": False,
+            "error": str(e),
+            "output": output.getvalue()
+        }
+
+
+def _serve_line(api, line: str, lock: threading.Lock) -> Optional[str]:
+    """解析一行JSON命令并返回一行JSON响应"""
+    line = line.strip()
+    if not line:
+        return None
+    
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("命令必须是JSON对象")
+    except ValueError as e:
+        response = {"id": None, "ok": False, "success": False, "error": f"无效的JSON命令: {str(e)}"}
+    else:
+        # BitgetAPI 与 redirect_stdout 都不是线程安全的，命令串行执行
+        with lock:
+            response = dispatch_serve_command(api, request)
+    
+    return json.dumps(response, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class _ServeRequestHandler(socketserver.StreamRequestHandler):
+    """Unix socket 连接处理器，每行一条命令"""
+    
+    def handle(self):
+        for raw in self.rfile:
+            reply = _serve_line(self.server.api, raw.decode('utf-8'), self.server.lock)
+            if reply is not None:
+                self.wfile.write((reply + "\n").encode('utf-8'))
+                self.wfile.flush()
+
+
+def handle_serve(api, socket_path: Optional[str] = None):
+    """
+    常驻服务：保持一个 BitgetAPI 实例，按行读取JSON命令并按行输出JSON响应
+    
+    Args:
+        api: BitgetAPI 实例
+        socket_path: Unix socket 路径，为空时使用 stdin/stdout
+    """
+    lock = threading.Lock()
+    
+    if not socket_path:
+        # stdout 只输出响应行，提示信息写到 stderr
+        print(f"🟢 Bitget 服务已启动 (pid={os.getpid()})，从 stdin 读取命令", file=sys.stderr, flush=True)
+        out = sys.stdout
+        # 后台线程（合约刷新等）的输出也不能混入响应行
+        with contextlib.redirect_stdout(sys.stderr):
+            for line in sys.stdin:
+                reply = _serve_line(api, line, lock)
+                if reply is not None:
+                    out.write(reply + "\n")
+                    out.flush()
+        return
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _ServeRequestHandler)
+    server.daemon_threads = True
+    server.api = api
+    server.lock = lock
+    print(f"🟢 Bitget 服务已启动 (pid={os.getpid()})，监听 {socket_path}", file=sys.stderr, flush=True)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
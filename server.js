@@ -82,6 +82,7 @@ function gracefulShutdown() {
     console.log(`已清理组 ${groupId} 的定时器`);
   }
   STRATEGY_TIMERS.clear();
+  stopPythonDaemons();
   
   console.log('服务器已优雅关闭');
   process.exit(0);
@@ -1198,8 +1199,29 @@ function isStockSymbol(symbol) {
   return stockSymbols.includes(symbol);
 }
 
+// Bitget 行情接口限流（20次/秒/IP）：令牌桶，所有并发请求共享
+function createTokenBucket(ratePerSec, capacity = ratePerSec) {
+  let tokens = capacity;
+  let updatedAt = Date.now();
+  return async function acquire() {
+    for (;;) {
+      const now = Date.now();
+      tokens = Math.min(capacity, tokens + ((now - updatedAt) / 1000) * ratePerSec);
+      updatedAt = now;
+      if (tokens >= 1) {
+        tokens -= 1;
+        return;
+      }
+      await new Promise((r) => setTimeout(r, Math.ceil(((1 - tokens) / ratePerSec) * 1000)));
+    }
+  };
+}
+
+const acquireBitgetMarketToken = createTokenBucket(20);
+
 async function fetchBitgetV1TickerLast(symbol) {
   try {
+    await acquireBitgetMarketToken();
     const normalizedSymbol = deriveBitgetSymbol(symbol);
     if (!normalizedSymbol) {
       throw new Error('无效的 Bitget 交易对');
@@ -1247,8 +1269,6 @@ app.post('/api/groups/:groupId/refresh-prices', async (req, res) => {
         console.error(`更新${bitgetSymbol}价格时发生异常:`, e.message);
         // 忽略单个失败，继续
       }
-      // 轻微延迟，降低风控触发
-      await new Promise((r) => setTimeout(r, 120));
     }
 
     if (!writeAssets(data)) {
@@ -1305,7 +1325,6 @@ async function runRebalanceOnce(groupId) {
     } catch (error) {
       console.error(`刷新${a.symbol}价格失败:`, error.message);
     }
-    await new Promise(r => setTimeout(r, 120));
   }
 
   if (needsRebaseline) {
@@ -2222,7 +2241,119 @@ async function getUsdtPriceForCoinOrSymbol(coinOrSymbol) {
   return { symbol, price };
 }
 
-function runPythonMarketOrder({ coin, side, size, marginMode, cfg }) {
+// === Python 常驻服务（bitget_api.py serve）===
+// 每组凭证保持一个常驻进程，避免每笔订单都重新启动 Python 并加载合约缓存
+const PYTHON_DAEMONS = new Map();
+const PYTHON_DAEMON_TIMEOUT_MS = 30000;
+
+function pythonDaemonKey(cfg) {
+  return crypto.createHash('sha256')
+    .update([cfg.apiKey || '', cfg.secretKey || '', cfg.passphrase || '', cfg.sandbox ? '1' : '0'].join('\n'))
+    .digest('hex');
+}
+
+function getPythonDaemon(cfg) {
+  const key = pythonDaemonKey(cfg);
+  const existing = PYTHON_DAEMONS.get(key);
+  if (existing && !existing.closed) return existing;
+
+  const args = [
+    'bitget_api.py',
+    '--api-key', cfg.apiKey || '',
+    '--secret-key', cfg.secretKey || '',
+    '--passphrase', cfg.passphrase || '',
+  ];
+  if (cfg.sandbox) args.push('--sandbox');
+  args.push('serve');
+  const proc = spawn('python3', args, { cwd: __dirname });
+  const daemon = { proc, nextId: 1, pending: new Map(), buffer: '', closed: false };
+
+  proc.stdout.on('data', (d) => {
+    daemon.buffer += d.toString();
+    let idx;
+    while ((idx = daemon.buffer.indexOf('\n')) >= 0) {
+      const line = daemon.buffer.slice(0, idx).trim();
+      daemon.buffer = daemon.buffer.slice(idx + 1);
+      if (!line) continue;
+      let msg;
+      try {
+        msg = JSON.parse(line);
+      } catch (e) {
+        continue;
+      }
+      const waiter = daemon.pending.get(msg.id);
+      if (waiter) {
+        daemon.pending.delete(msg.id);
+        clearTimeout(waiter.timer);
+        waiter.resolve(msg);
+      }
+    }
+  });
+  proc.stderr.on('data', (d) => console.log(`[bitget_api] ${d.toString().trim()}`));
+  const onExit = (error) => {
+    daemon.closed = true;
+    if (PYTHON_DAEMONS.get(key) === daemon) PYTHON_DAEMONS.delete(key);
+    for (const waiter of daemon.pending.values()) {
+      clearTimeout(waiter.timer);
+      waiter.reject(error || new Error('Python 常驻服务已退出'));
+    }
+    daemon.pending.clear();
+  };
+  proc.on('error', (error) => {
+    // 进程无法启动（如找不到 python3），命令未被执行
+    error.daemonUnavailable = true;
+    onExit(error);
+  });
+  proc.on('close', () => onExit());
+  proc.stdin.on('error', () => { /* 进程退出后由 close 事件统一处理 */ });
+
+  PYTHON_DAEMONS.set(key, daemon);
+  return daemon;
+}
+
+function callPythonDaemon(cfg, command, timeoutMs = PYTHON_DAEMON_TIMEOUT_MS) {
+  return new Promise((resolve, reject) => {
+    const daemon = getPythonDaemon(cfg);
+    const id = daemon.nextId++;
+    const timer = setTimeout(() => {
+      daemon.pending.delete(id);
+      reject(new Error('Python 常驻服务响应超时'));
+    }, timeoutMs);
+    daemon.pending.set(id, { resolve, reject, timer });
+    daemon.proc.stdin.write(JSON.stringify({ ...command, id }) + '\n');
+  });
+}
+
+function stopPythonDaemons() {
+  for (const daemon of PYTHON_DAEMONS.values()) {
+    daemon.closed = true;
+    try { daemon.proc.stdin.end(); } catch (e) { /* ignore */ }
+    daemon.proc.kill();
+  }
+  PYTHON_DAEMONS.clear();
+}
+
+async function runPythonMarketOrder({ coin, side, size, marginMode, cfg }) {
+  try {
+    const reply = await callPythonDaemon(cfg, {
+      cmd: 'market',
+      coin,
+      side,
+      size: String(size),
+      margin_mode: marginMode
+    });
+    return { code: reply.ok ? 0 : 1, success: !!reply.success, out: reply.output || '', err: reply.error || '' };
+  } catch (error) {
+    // 仅在服务未能启动时退回单次进程；超时或中途退出时订单可能已提交，不能重发
+    if (error.daemonUnavailable) {
+      console.warn(`Python 常驻服务不可用，改用单次进程: ${error.message}`);
+      return runPythonMarketOrderOnce({ coin, side, size, marginMode, cfg });
+    }
+    return { code: 1, success: false, out: '', err: error.message };
+  }
+}
+
+function runPythonMarketOrderOnce({ coin, side, size, marginMode, cfg }) {
   return new Promise((resolve) => {
     const args = [
       'bitget_api.py',
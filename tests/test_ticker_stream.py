@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import bitget_api
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+def wait_until(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class StandInServer:
+    """本地的 Bitget 公共 WebSocket 替身：记录订阅消息，按需推送 ticker，可主动断开所有连接"""
+    
+    def __init__(self):
+        self.subscriptions = []  # 每条订阅消息中的 instId 列表
+        self.pings = 0
+        self._sockets = []
+        self._loop = asyncio.new_event_loop()
+        
+        app = web.Application()
+        app.router.add_get("/ws", self._handler)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/ws"
+        
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+    
+    async def _handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        async for message in ws:
+            if message.data == "ping":
+                self.pings += 1
+                await ws.send_str("pong")
+                continue
+            payload = json.loads(message.data)
+            if payload.get("op") == "subscribe":
+                self.subscriptions.append(sorted(arg["instId"] for arg in payload["args"]))
+        return ws
+    
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(2)
+    
+    def push(self, symbol: str, price: str):
+        message = json.dumps({
+            "action": "snapshot",
+            "arg": {"instType": "USDT-FUTURES", "channel": "ticker", "instId": symbol},
+            "data": [{"instId": symbol, "lastPr": price, "change24h": "0.01", "baseVolume": "10",
+                      "ts": str(int(time.time() * 1000))}]
+        })
+        
+        async def send():
+            for ws in self._sockets:
+                if not ws.closed:
+                    await ws.send_str(message)
+        self._call(send())
+    
+    def drop_connections(self):
+        async def close():
+            for ws in self._sockets:
+                await ws.close()
+            self._sockets.clear()
+        self._call(close())
+    
+    def close(self):
+        self.drop_connections()
+        self._call(self._runner.cleanup())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(2)
+
+
+@unittest.skipIf(web is None, "需要 aiohttp")
+class TickerStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer()
+        self.stream = bitget_api.TickerStream(["BTCUSDT", "ETHUSDT"], url=self.server.url, max_age=0.3,
+                                              reconnect_delay=0.05, max_reconnect_delay=0.1)
+        self.stream.start(wait=2)
+        self.assertTrue(self.stream.connected.is_set())
+    
+    def tearDown(self):
+        self.stream.stop()
+        self.server.close()
+    
+    def test_subscribes_and_receives_tickers(self):
+        self.assertTrue(wait_until(lambda: self.server.subscriptions))
+        self.assertEqual(self.server.subscriptions[0], ["BTCUSDT", "ETHUSDT"])
+        
+        self.server.push("BTCUSDT", "65000.5")
+        self.assertTrue(wait_until(lambda: self.stream.get("BTCUSDT") is not None))
+        self.assertEqual(self.stream.get("BTCUSDT")["lastPr"], "65000.5")
+        self.assertIsNone(self.stream.get("ETHUSDT"))
+        self.assertEqual(self.stream.stats_snapshot()["messages"], 1)
+        
+        # 已连接时增加订阅只发送新增的交易对
+        self.stream.subscribe(["SOLUSDT", "BTCUSDT"])
+        self.assertTrue(wait_until(lambda: len(self.server.subscriptions) == 2))
+        self.assertEqual(self.server.subscriptions[1], ["SOLUSDT"])
+    
+    def test_stale_price_falls_back_to_rest(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            api = bitget_api.BitgetAPI("k", "s", "p", log_file=os.path.join(workdir, "trading_log.jsonl"),
+                                       price_cache_ttl=0)
+            api._resolve_price_symbol = lambda coin: coin.upper()
+            rest_calls = []
+            api._fetch_ticker = lambda symbol: rest_calls.append(symbol) or {
+                "success": True, "symbol": symbol, "price": 1.0, "source": "rest"}
+            api.ticker_stream = self.stream
+            
+            self.server.push("BTCUSDT", "65000")
+            self.assertTrue(wait_until(lambda: self.stream.get("BTCUSDT") is not None))
+            price_info = api.get_ticker_price("BTCUSDT")
+            self.assertEqual(price_info["source"], "websocket")
+            self.assertEqual(price_info["price"], 65000.0)
+            self.assertEqual(rest_calls, [])
+            
+            # 超过 max_age 没有新推送：视为过期，改用 REST
+            time.sleep(0.4)
+            self.assertIsNone(self.stream.get("BTCUSDT"))
+            self.assertEqual(api.get_ticker_price("BTCUSDT")["source"], "rest")
+            self.assertEqual(rest_calls, ["BTCUSDT"])
+            api.ticker_stream = None
+            api.close()
+    
+    def test_reconnects_and_resubscribes(self):
+        self.stream.subscribe(["SOLUSDT"])
+        self.assertTrue(wait_until(lambda: len(self.server.subscriptions) == 2))
+        
+        self.server.drop_connections()
+        self.assertTrue(wait_until(lambda: self.stream.stats_snapshot()["connects"] == 2))
+        self.assertTrue(wait_until(lambda: len(self.server.subscriptions) == 3))
+        # 重连后一次订阅全部交易对，包括连接期间新增的
+        self.assertEqual(self.server.subscriptions[2], ["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+        
+        self.server.push("SOLUSDT", "150")
+        self.assertTrue(wait_until(lambda: self.stream.get("SOLUSDT") is not None))
+        self.assertEqual(self.stream.get("SOLUSDT")["lastPr"], "150")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import bitget_api
+
+
+LEGACY_RECORDS = [
+    {"timestamp": "2024-01-01T00:00:00", "trade_id": "trade_1", "coin": "BTC", "action": "buy",
+     "size": 0.001, "status": "success"},
+    {"timestamp": "2024-01-02T00:00:00", "trade_id": "trade_2", "coin": "ETH", "action": "sell",
+     "size": 0.1, "status": "failed"},
+]
+
+
+def write_legacy_log(path: str):
+    """按旧版格式（indent=2 的单个 JSON 文档）写入交易日志"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"trading_records": LEGACY_RECORDS, "created_at": "", "last_updated": ""},
+                  f, indent=2, ensure_ascii=False)
+
+
+class LegacyMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+    
+    def tearDown(self):
+        self._tmp.cleanup()
+    
+    def assert_migrated(self, journal: bitget_api.TradeJournal, backup: str):
+        self.assertEqual(journal.count(), 2)
+        self.assertEqual(journal.tail(0), LEGACY_RECORDS)
+        self.assertTrue(os.path.exists(backup))
+        
+        journal.append([{"trade_id": "trade_3", "status": "success"}])
+        reopened = bitget_api.TradeJournal(journal.path, legacy_path=journal.legacy_path)
+        self.assertEqual([r["trade_id"] for r in reopened.tail(0)], ["trade_1", "trade_2", "trade_3"])
+    
+    def test_migrates_sibling_legacy_file(self):
+        legacy = os.path.join(self.dir, "trading_log.json")
+        write_legacy_log(legacy)
+        journal = bitget_api.TradeJournal(os.path.join(self.dir, "trading_log.jsonl"), legacy_path=legacy)
+        
+        self.assert_migrated(journal, legacy + ".migrated")
+        self.assertFalse(os.path.exists(legacy))
+    
+    def test_log_file_is_legacy_path(self):
+        # 调用方沿用旧的默认 log_file="trading_log.json"：path 与 legacy_path 相同
+        path = os.path.join(self.dir, "trading_log.json")
+        write_legacy_log(path)
+        # 旧版本迁移失败时留下的过期索引
+        with open(path + ".idx", 'wb') as f:
+            f.write(b"\0" * 16)
+        journal = bitget_api.TradeJournal(path, legacy_path=path)
+        
+        self.assert_migrated(journal, path + ".migrated")
+    
+    def test_custom_log_file_in_legacy_format(self):
+        path = os.path.join(self.dir, "my_trades.json")
+        write_legacy_log(path)
+        journal = bitget_api.TradeJournal(path, legacy_path=os.path.join(self.dir, "trading_log.json"))
+        
+        self.assert_migrated(journal, path + ".migrated")
+    
+    def test_existing_journal_is_not_migrated(self):
+        path = os.path.join(self.dir, "trading_log.jsonl")
+        journal = bitget_api.TradeJournal(path)
+        journal.append([{"trade_id": "trade_new", "status": "success"}])
+        
+        legacy = os.path.join(self.dir, "trading_log.json")
+        write_legacy_log(legacy)
+        reopened = bitget_api.TradeJournal(path, legacy_path=legacy)
+        
+        self.assertEqual(reopened.count(), 1)
+        self.assertTrue(os.path.exists(legacy))
+
+
+class IntervalFsyncTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "trading_log.jsonl")
+    
+    def tearDown(self):
+        self._tmp.cleanup()
+    
+    def append_twice(self, journal: bitget_api.TradeJournal):
+        # 第一次追加立即刷盘，间隔内的第二次追加只写入页缓存
+        journal.append([{"trade_id": "trade_1"}])
+        journal.append([{"trade_id": "trade_2"}])
+    
+    def test_timer_flushes_after_interval(self):
+        journal = bitget_api.TradeJournal(self.path, fsync_interval=0.1)
+        with mock.patch.object(bitget_api.os, "fsync", wraps=os.fsync) as fsync:
+            self.append_twice(journal)
+            self.assertEqual(fsync.call_count, 2)
+            deadline = time.monotonic() + 2
+            while fsync.call_count < 4 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(fsync.call_count, 4)
+        journal.close()
+    
+    def test_close_flushes_pending_appends(self):
+        journal = bitget_api.TradeJournal(self.path, fsync_interval=60)
+        with mock.patch.object(bitget_api.os, "fsync", wraps=os.fsync) as fsync:
+            self.append_twice(journal)
+            self.assertEqual(fsync.call_count, 2)
+            journal.close()
+            self.assertEqual(fsync.call_count, 4)
+            journal.close()
+            self.assertEqual(fsync.call_count, 4)
+    
+    def test_flushes_on_exit(self):
+        script = (
+            "import os, sys\n"
+            "import bitget_api\n"
+            "real_fsync = os.fsync\n"
+            "def fsync(fd):\n"
+            "    print('fsync', flush=True)\n"
+            "    real_fsync(fd)\n"
+            "bitget_api.os.fsync = fsync\n"
+            "journal = bitget_api.TradeJournal(sys.argv[1], fsync_interval=60)\n"
+            "journal.append([{'trade_id': 'trade_1'}])\n"
+            "journal.append([{'trade_id': 'trade_2'}])\n"
+            "print('appended', flush=True)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", script, self.path], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.split()
+        self.assertEqual(output, ["fsync", "fsync", "appended", "fsync", "fsync"])
+
+
+if __name__ == "__main__":
+    unittest.main()